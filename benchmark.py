@@ -0,0 +1,258 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+import intermediate_vehicle
+import speed_vs_charge
+import speed_vs_time
+import vehicle_cost
+
+
+SCALAR_SIZES = (10, 1000)
+BATCH_SIZES = (10, 1000, 100000)
+SEED = 0
+
+BENCHMARKS = {}
+
+
+def benchmark(name, sizes):
+    '''
+    register setup(size, rng) -> zero argument callable to be timed
+    '''
+    def register(setup):
+        BENCHMARKS[name] = (setup, sizes)
+        return setup
+    return register
+
+def random_vehicles(n, rng):
+    '''
+    vehicle_cost.main_batch columns for n made up vehicles
+    '''
+    return dict(purchase_cost_no_tax = rng.uniform(5000, 60000, n),
+                tax_rate = rng.choice([1.0, 1.06, 1.09], n),
+                depreciation_coef = rng.uniform(0.8, 0.95, n),
+                miles_per_year = rng.uniform(5000, 20000, n),
+                insurance_rate = rng.uniform(400, 700, n),
+                starting_mileage = rng.choice([0, 25000, 60000], n),
+                mpg = rng.uniform(18, 55, n),
+                fuel_price = rng.uniform(2.5, 5.0, n),
+                selling_mileage = rng.uniform(100000, 200000, n),
+                maintenance_per_year = rng.uniform(300, 1500, n))
+
+def random_costs_inputs(n, rng):
+    '''
+    intermediate_vehicle.get_costs keyword columns for n made up vehicles
+    '''
+    return dict(purchase_cost_no_tax = rng.uniform(5000, 60000, n),
+                tax_rate = rng.choice([1.0, 1.07], n),
+                miles_per_year = rng.uniform(5000, 20000, n),
+                insurance_rate = rng.uniform(400, 700, n),
+                starting_mileage = rng.choice([0, 25000], n),
+                mpg = rng.uniform(18, 55, n),
+                fuel_price = rng.uniform(2.5, 5.0, n),
+                vehicle_life_in_miles = 300000,
+                maintenance_per_year = rng.uniform(200, 800, n),
+                apr = rng.uniform(0.0, 0.06, n),
+                loan_term = 72)
+
+def _rows(columns, n):
+    return [{k: (v[i] if np.ndim(v) else v) for k, v in columns.items()} for i in range(n)]
+
+@contextlib.contextmanager
+def _quiet():
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+@benchmark('vehicle_cost.main', SCALAR_SIZES)
+def _vehicle_cost_main(n, rng):
+    rows = _rows(random_vehicles(n, rng), n)
+    def run():
+        all_cost, all_summary = [], []
+        with _quiet():
+            for i, row in enumerate(rows):
+                vehicle_cost.main(all_cost, all_summary, str(i), **row)
+    return run
+
+@benchmark('vehicle_cost.evaluate', SCALAR_SIZES)
+def _vehicle_cost_evaluate(n, rng):
+    rows = _rows(random_vehicles(n, rng), n)
+    def run():
+        for i, row in enumerate(rows):
+            vehicle_cost.evaluate(str(i), **row)
+    return run
+
+@benchmark('vehicle_cost.main_batch', BATCH_SIZES)
+def _vehicle_cost_main_batch(n, rng):
+    columns = random_vehicles(n, rng)
+    return lambda: vehicle_cost.main_batch(**columns)
+
+@benchmark('intermediate_vehicle.get_costs', SCALAR_SIZES)
+def _get_costs(n, rng):
+    rows = _rows(random_costs_inputs(n, rng), n)
+    def run():
+        all_cars = {}
+        for i, row in enumerate(rows):
+            intermediate_vehicle.get_costs(all_cars, str(i), **row)
+    return run
+
+@benchmark('intermediate_vehicle.cost_compare', (10, 50))
+def _cost_compare(n, rng):
+    '''
+    n is the number of years compared
+    '''
+    all_cars = {}
+    for i, row in enumerate(_rows(random_costs_inputs(2, rng), 2)):
+        intermediate_vehicle.get_costs(all_cars, str(i), **row)
+    def run():
+        with _quiet():
+            intermediate_vehicle.cost_compare(all_cars, '0', '1', 72, n, 1.04)
+    return run
+
+@benchmark('intermediate_vehicle.get_costs_batch', BATCH_SIZES)
+def _get_costs_batch(n, rng):
+    columns = random_costs_inputs(n, rng)
+    return lambda: intermediate_vehicle.get_costs_batch(**columns)
+
+@benchmark('intermediate_vehicle.all_pairs', (100, 2000))
+def _all_pairs(n, rng):
+    '''
+    n vehicles, n**2 pairs
+    '''
+    initial_cost, usage_cost = intermediate_vehicle.get_costs_batch(**random_costs_inputs(n, rng))
+    out = np.empty((n, n))
+    return lambda: intermediate_vehicle.cost_compare_all_pairs(initial_cost, usage_cost, 72, 15, 1.04, out=out)
+
+@benchmark('speed_vs_charge.miles_per_day', SCALAR_SIZES)
+def _miles_per_day(n, rng):
+    speed = [int(s) for s in rng.integers(20, 100, n)]
+    efficiency = list(rng.uniform(0.12, 0.42, n))
+    def run():
+        with _quiet():
+            for s, e in zip(speed, efficiency):
+                speed_vs_charge.miles_per_day(s, e, 8, 23)
+    return run
+
+@benchmark('speed_vs_charge.time_traveled', SCALAR_SIZES)
+def _time_traveled(n, rng):
+    speed = [int(s) for s in rng.integers(20, 100, n)]
+    efficiency = list(rng.uniform(0.12, 0.42, n))
+    def run():
+        with _quiet():
+            for s, e in zip(speed, efficiency):
+                speed_vs_charge.time_traveled(s, e, 8, 65, 372)
+    return run
+
+@benchmark('speed_vs_charge.charge_grid', (1000, 1000000))
+def _charge_grid(n, rng):
+    '''
+    n speed x charge_rate x T combinations, 10 charge rates and 10 day lengths
+    '''
+    speed = np.sort(rng.uniform(20, 100, 10))
+    efficiency = np.sort(rng.uniform(0.12, 0.42, 10))
+    curve = speed_vs_charge.efficiency_curve(speed, efficiency, 'pchip')
+    speeds = np.linspace(20, 100, n // 100)
+    return lambda: speed_vs_charge.charge_grid(speeds, np.linspace(3, 20, 10), np.linspace(1, 24, 10), curve)
+
+@benchmark('speed_vs_time.compute_pipeline', SCALAR_SIZES + (100000,))
+def _speed_vs_time_pipeline(n, rng):
+    speed = list(rng.uniform(20, 100, n))
+    power = list(rng.uniform(5, 55, n))
+    def run():
+        energy_per_mile = speed_vs_time.compute_energy_per_mile(speed, power)
+        speed_vs_time.compute_range(82, energy_per_mile)
+        charge_time = speed_vs_time.compute_charge_time(82, 125, 0.6)
+        time_traveled = speed_vs_time.compute_time_to_empty(82, 0.6, power)
+        distance = speed_vs_time.compute_dist_traveled(time_traveled, speed)
+        speed_vs_time.get_real_speed(charge_time, time_traveled, distance)
+        speed_vs_time.compute_cost(0.26, energy_per_mile)
+    return run
+
+
+def time_call(func, min_seconds = 0.2, repeat = 5):
+    '''
+    best per-call time over repeat rounds of enough calls to last min_seconds
+    '''
+    func()
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds / repeat or number >= 1 << 20:
+            break
+        number *= 2
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+def run(names = None, min_seconds = 0.2):
+    results = {}
+    for name, (setup, sizes) in sorted(BENCHMARKS.items()):
+        if names and not any(name.startswith(n) for n in names):
+            continue
+        for size in sizes:
+            seconds = time_call(setup(size, np.random.default_rng(SEED)), min_seconds)
+            key = "{}[{}]".format(name, size)
+            results[key] = seconds
+            print("{:<50} {:10.3e} s  {:10.3e} s/row".format(key, seconds, seconds / size), file=sys.stderr)
+    return {'meta': {'python': platform.python_version(),
+                     'numpy': np.__version__,
+                     'machine': platform.machine(),
+                     'seed': SEED},
+            'results': results}
+
+def compare(baseline, current, threshold = 0.10):
+    '''
+    benchmarks slower than baseline by more than threshold, key -> ratio
+    '''
+    regressions = {}
+    for key, seconds in sorted(current['results'].items()):
+        if key not in baseline['results']:
+            continue
+        ratio = seconds / baseline['results'][key]
+        print("{:<50} {:6.2f}x".format(key, ratio))
+        if ratio > 1 + threshold:
+            regressions[key] = ratio
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "time every model kernel")
+    commands = parser.add_subparsers(dest = 'command', required = True)
+    run_parser = commands.add_parser('run')
+    run_parser.add_argument('-o', '--output', default = 'benchmark.json')
+    run_parser.add_argument('-k', '--only', nargs = '*', help = "benchmark name prefixes")
+    run_parser.add_argument('--min-seconds', type = float, default = 0.2)
+    compare_parser = commands.add_parser('compare')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current', nargs = '?', help = "results json, runs the suite if omitted")
+    compare_parser.add_argument('--threshold', type = float, default = 0.10)
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        with open(args.output, 'w') as f:
+            json.dump(run(args.only, args.min_seconds), f, indent = 1)
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if args.current:
+            with open(args.current) as f:
+                current = json.load(f)
+        else:
+            current = run()
+        regressions = compare(baseline, current, args.threshold)
+        for key, ratio in regressions.items():
+            print("REGRESSION {} {:.2f}x slower".format(key, ratio))
+        sys.exit(1 if regressions else 0)
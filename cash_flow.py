@@ -0,0 +1,78 @@
+import numpy as np
+
+
+def monthly_cash_flows(initial_cost,
+                       usage_cost,
+                       loan_term,
+                       num_months,
+                       start_month = 0,
+                       resale_month = None,
+                       resale_amt = 0.0):
+    '''
+    month by month outflows of every vehicle, shape (n, num_months)
+
+    initial_cost and usage_cost are get_costs(_batch) outputs. the loan is
+    loan_term equal payments of initial_cost / loan_term (any whole number of
+    months, 0 pays cash in the purchase month) starting at start_month, and
+    usage costs usage_cost / 12 every month the vehicle is owned.
+    resale_month (nan for none) books resale_amt as an inflow and ends the
+    usage costs after that month; remaining loan payments stay due
+    '''
+    month = np.arange(num_months)
+    column = lambda v: np.asarray(v, dtype=float).reshape(-1, 1)
+    initial_cost, usage_cost, loan_term, start_month = (column(v) for v in (initial_cost, usage_cost, loan_term, start_month))
+    n = max(len(v) for v in (initial_cost, usage_cost, loan_term, start_month))
+
+    age = month - start_month
+    payment = initial_cost / np.maximum(loan_term, 1)
+    flows = np.zeros((n, num_months))
+    flows += np.where((age >= 0) & (age < np.maximum(loan_term, 1)), payment, 0.0)
+
+    owned = age >= 0
+    if resale_month is not None:
+        resale_month = column(resale_month)
+        owned = owned & ~(month > resale_month)
+        flows -= np.where(month == resale_month, column(resale_amt), 0.0)
+    flows += np.where(owned, usage_cost / 12, 0.0)
+    return flows
+
+def period_totals(flows, months_per_period = 12):
+    '''
+    sum months into periods, (n, num_months) -> (n, ceil(num_months / months_per_period))
+    with 12 and a year multiple loan_term these are cost_compare's yearly costs
+    '''
+    n, num_months = flows.shape
+    periods = -(-num_months // months_per_period)
+    padded = np.zeros((n, periods * months_per_period))
+    padded[:, :num_months] = flows
+    return padded.reshape(n, periods, months_per_period).sum(axis=-1)
+
+def accrue(flows, opp_cost_rate, compound_every = 1):
+    '''
+    accrued cost after every period, compounding the yearly opp_cost_rate
+    every compound_every months, shape (n, periods)
+
+    accrued[p] = rate * accrued[p-1] + period_cost[p] is evaluated as
+    rate**p * cumsum(period_cost / rate**p), one pass over all periods
+    '''
+    totals = period_totals(flows, compound_every)
+    rate = np.asarray(opp_cost_rate, dtype=float).reshape(-1, 1) ** (compound_every / 12.0)
+    scale = rate ** np.arange(totals.shape[1])
+    return scale * np.cumsum(totals / scale, axis=-1)
+
+def compare_cash_flows(flows_a, flows_b, opp_cost_rate, compound_every = 1):
+    '''
+    cost_compare on monthly flows, every result is (n, periods)
+
+    with compound_every = 12 and year multiple loan terms this reproduces
+    cost_compare_horizons; compound_every = 1 compounds monthly. net_gain_a
+    follows cost_compare's recurrence per period, which is linear in the
+    cost difference: net_gain_a = (1 + rate) / 2 * (a_accrued - b_accrued)
+    returns dict of arrays: net_gain_a, a_accrued, b_accrued
+    '''
+    a_accrued = accrue(flows_a, opp_cost_rate, compound_every)
+    b_accrued = accrue(flows_b, opp_cost_rate, compound_every)
+    rate = np.asarray(opp_cost_rate, dtype=float).reshape(-1, 1) ** (compound_every / 12.0)
+    return {'net_gain_a': (1 + rate) / 2 * (a_accrued - b_accrued),
+            'a_accrued': a_accrued,
+            'b_accrued': b_accrued}
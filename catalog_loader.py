@@ -0,0 +1,182 @@
+import csv
+import inspect
+import itertools
+import json
+import time
+
+import numpy as np
+
+from vehicle_cost import main_batch
+
+
+TRUE_STRINGS = ('1', 'true', 'yes', 'y', '*')
+REQUIRED = object()
+
+
+class CatalogError(ValueError):
+    pass
+
+
+class LoadStats(object):
+    '''
+    running throughput of a catalog stream
+    '''
+
+    def __init__(self):
+        self.rows = 0
+        self.batches = 0
+        self.seconds = 0.0
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+    def __repr__(self):
+        return "{} rows in {} batches, {:.2f} s, {:.0f} rows/s".format(
+                self.rows, self.batches, self.seconds, self.rows_per_sec)
+
+
+def model_fields(model):
+    '''
+    numeric columns a batch model takes, name -> default (REQUIRED if none)
+    '''
+    fields = {}
+    for name, param in inspect.signature(model).parameters.items():
+        if name in ('all_cars', 'all_cost', 'all_summary', 'name', 'is_new'):
+            continue
+        fields[name] = REQUIRED if param.default is inspect.Parameter.empty else param.default
+    return fields
+
+def _csv_records(f):
+    reader = csv.reader(f)
+    header = [h.strip() for h in next(reader)]
+    return header, reader
+
+def _check_rows(rows, lines, header, path):
+    '''
+    drop blank records, a row of the wrong width is a CatalogError
+    returns the kept rows and their line numbers
+    '''
+    kept, kept_lines = [], []
+    for row, line in zip(rows, lines):
+        if not any(v.strip() for v in row):
+            continue
+        if len(row) != len(header):
+            raise CatalogError("{}:{}: expected {} fields, got {}".format(path, line, len(header), len(row)))
+        kept.append(row)
+        kept_lines.append(line)
+    return kept, kept_lines
+
+def _chunks(path, chunk_rows):
+    '''
+    yields (line numbers, header, list of rows) without reading past the chunk,
+    one line number per row, where the row starts in the file
+    '''
+    with open(path, newline='') as f:
+        if path.endswith('.csv'):
+            header, reader = _csv_records(f)
+            line = 2
+            while True:
+                rows, ends = [], []
+                for row in itertools.islice(reader, chunk_rows):
+                    rows.append(row)
+                    ends.append(reader.line_num)
+                if not rows:
+                    return
+                # a quoted field may span lines, a row starts after the previous one ends
+                lines = [line] + [end + 1 for end in ends[:-1]]
+                if set(map(len, rows)) != {len(header)}:
+                    rows, lines = _check_rows(rows, lines, header, path)
+                if rows:
+                    yield lines, header, rows
+                line = ends[-1] + 1
+        else:
+            line = 1
+            while True:
+                texts = list(itertools.islice(f, chunk_rows))
+                if not texts:
+                    return
+                records, lines = [], []
+                for i, text in enumerate(texts, start = line):
+                    if text.strip():
+                        try:
+                            records.append(json.loads(text))
+                        except ValueError as e:
+                            raise CatalogError("{}:{}: {}".format(path, i, e))
+                        lines.append(i)
+                yield lines, None, records
+                line += len(texts)
+
+def _is_blank(v):
+    return v is None or v == ''
+
+def _has_blank(values):
+    return '' in values or None in values
+
+def _column(values, name, default, path, lines):
+    '''
+    float array of a field, blanks take the default (nan when the default is None)
+    lines holds the line number of every value, for errors
+    '''
+    if _has_blank(values):
+        if default is REQUIRED:
+            missing = next(i for i, v in enumerate(values) if _is_blank(v))
+            raise CatalogError("{}:{}: missing required field \"{}\"".format(path, lines[missing], name))
+        fill = np.nan if default is None else default
+        values = [fill if _is_blank(v) else v for v in values]
+    try:
+        return np.array(values, dtype=float)
+    except (TypeError, ValueError):
+        for i, v in enumerate(values):
+            try:
+                float(v)
+            except (TypeError, ValueError):
+                raise CatalogError("{}:{}: field \"{}\" is not a number: {!r}".format(path, lines[i], name, v))
+        raise
+
+def iter_batches(path, model = main_batch, chunk_rows = 65536, stats = None):
+    '''
+    stream a .csv (with header) or .jsonl catalog as columnar batches
+
+    each batch is (names, is_new, columns) where columns holds one float array
+    per numeric input of model; missing optional fields take the model default
+    and unknown fields are ignored. only chunk_rows rows are held at a time
+    '''
+    fields = model_fields(model)
+    stats = stats if stats is not None else LoadStats()
+    start = time.perf_counter()
+    for lines, header, rows in _chunks(path, chunk_rows):
+        if header is not None:
+            index = {h: i for i, h in enumerate(header)}
+            missing = [k for k, d in fields.items() if d is REQUIRED and k not in index]
+            if missing:
+                raise CatalogError("{}: missing required columns {}".format(path, missing))
+            transposed = list(zip(*rows))
+            absent = (None,) * len(rows)
+            get = lambda k: transposed[index[k]] if k in index else absent
+        else:
+            get = lambda k: tuple(r.get(k) for r in rows)
+
+        names = get('name')
+        is_new = np.array([str(v).strip().lower() in TRUE_STRINGS for v in get('is_new')], dtype=bool)
+        columns = {}
+        for k, default in fields.items():
+            values = get(k)
+            if default is not REQUIRED and values.count(None) + values.count('') == len(values):
+                # absent optional column, let the model apply its own default
+                continue
+            columns[k] = _column(values, k, default, path, lines)
+
+        stats.rows += len(rows)
+        stats.batches += 1
+        stats.seconds = time.perf_counter() - start
+        yield names, is_new, columns
+        # time spent by the consumer does not count against the loader
+        start = time.perf_counter() - stats.seconds
+
+def evaluate_catalog(path, model = main_batch, chunk_rows = 65536, stats = None):
+    '''
+    stream a catalog through a batch model, yields (names, is_new, results)
+    '''
+    for names, is_new, columns in iter_batches(path, model, chunk_rows, stats):
+        yield names, is_new, model(**columns)
@@ -0,0 +1,117 @@
+import numpy as np
+
+from catalog_loader import REQUIRED, model_fields
+from loan import compute_loan_cost_array
+from vehicle_cost import (get_fuel_cost_batch,
+                          get_insurance_cost,
+                          get_maintenance_cost,
+                          get_selling_amt,
+                          main_batch)
+
+
+# node -> (function, inputs it reads), same formulas as main_batch
+NODES = {
+    'miles_driven': (lambda selling_mileage, starting_mileage: selling_mileage - starting_mileage,
+                     ('selling_mileage', 'starting_mileage')),
+    'years_own': (lambda miles_driven, miles_per_year: miles_driven / (1.0 * miles_per_year),
+                  ('miles_driven', 'miles_per_year')),
+    'purchase_cost_with_tax': (lambda purchase_cost_no_tax, tax_rate: purchase_cost_no_tax * tax_rate,
+                               ('purchase_cost_no_tax', 'tax_rate')),
+    'selling_amt': (get_selling_amt,
+                    ('purchase_cost_no_tax', 'depreciation_coef', 'years_own',
+                     'mileage_deprec_importance', 'selling_mileage', 'vehicle_life_miles')),
+    'insurance_cost': (get_insurance_cost,
+                       ('insurance_rate', 'years_own')),
+    'maintenance_cost': (get_maintenance_cost,
+                         ('maintenance_per_year', 'full_maintenance_age', 'miles_driven',
+                          'years_own', 'vehicle_life_miles')),
+    'fuel_cost': (get_fuel_cost_batch,
+                  ('mpg', 'miles_driven', 'fuel_price', 'miles_per_kwh', 'elec_cost', 'elec_pct')),
+    'interest_cost': (lambda purchase_cost_with_tax, apr, loan_term:
+                          compute_loan_cost_array(purchase_cost_with_tax, apr / 12, loan_term),
+                      ('purchase_cost_with_tax', 'apr', 'loan_term')),
+    'total_cost': (lambda purchase_cost_with_tax, insurance_cost, fuel_cost, maintenance_cost, interest_cost, selling_amt:
+                       ( purchase_cost_with_tax
+                       + insurance_cost
+                       + fuel_cost
+                       + maintenance_cost
+                       + interest_cost
+                       - selling_amt),
+                   ('purchase_cost_with_tax', 'insurance_cost', 'fuel_cost', 'maintenance_cost',
+                    'interest_cost', 'selling_amt')),
+    'cost_per_mile': (lambda total_cost, miles_driven: total_cost / miles_driven,
+                      ('total_cost', 'miles_driven')),
+    'cost_per_year': (lambda total_cost, years_own: total_cost / years_own,
+                      ('total_cost', 'years_own')),
+    'cost_at_loan_payoff': (lambda purchase_cost_with_tax, interest_cost, fuel_cost, maintenance_cost,
+                                   insurance_cost, loan_term, years_own:
+                                purchase_cost_with_tax + interest_cost
+                                + ((fuel_cost + maintenance_cost + insurance_cost) * (loan_term/12) / years_own),
+                            ('purchase_cost_with_tax', 'interest_cost', 'fuel_cost', 'maintenance_cost',
+                             'insurance_cost', 'loan_term', 'years_own')),
+}
+
+
+class CostGraph(object):
+    '''
+    main_batch as a lazily evaluated dependency graph over catalog columns
+
+    node values are cached; set() drops only the nodes downstream of the
+    changed input, so a fuel price what-if recomputes fuel_cost and the totals
+    but reuses depreciation, insurance, maintenance and loan interest.
+    recomputed counts node evaluations
+    '''
+
+    def __init__(self, **inputs):
+        fields = model_fields(main_batch)
+        fields.pop('selling_amt')
+        missing = [k for k, d in fields.items() if d is REQUIRED and k not in inputs]
+        if missing:
+            raise TypeError("CostGraph missing required inputs {}".format(missing))
+        unknown = [k for k in inputs if k not in fields]
+        if unknown:
+            raise TypeError("CostGraph got unknown inputs {}".format(unknown))
+
+        self._inputs = {k: np.asarray(inputs.get(k, d), dtype=float) for k, d in fields.items()}
+        self._cache = {}
+        self.recomputed = {name: 0 for name in NODES}
+
+        self._dependents = {name: [] for name in list(self._inputs) + list(NODES)}
+        for name, (_, deps) in NODES.items():
+            for dep in deps:
+                self._dependents[dep].append(name)
+
+    def __getitem__(self, name):
+        if name in self._inputs:
+            return self._inputs[name]
+        if name not in self._cache:
+            func, deps = NODES[name]
+            self._cache[name] = func(*(self[dep] for dep in deps))
+            self.recomputed[name] += 1
+        return self._cache[name]
+
+    def set(self, **inputs):
+        '''
+        replace input columns and invalidate everything downstream of them
+        '''
+        stale = []
+        for name, values in inputs.items():
+            if name not in self._inputs:
+                raise KeyError("\"{}\" is not an input of the cost graph".format(name))
+            self._inputs[name] = np.asarray(values, dtype=float)
+            stale.extend(self._dependents[name])
+        while stale:
+            name = stale.pop()
+            if self._cache.pop(name, None) is not None:
+                stale.extend(self._dependents[name])
+
+    def results(self):
+        '''
+        same keys as main_batch
+        '''
+        shape = np.shape(self['cost_per_mile'])
+        return {'cost_per_mile': self['cost_per_mile'],
+                'cost_per_year': self['cost_per_year'],
+                'years_own': np.broadcast_to(self['years_own'], shape),
+                'selling_amt': np.broadcast_to(self['selling_amt'], shape),
+                'cost_at_loan_payoff': self['cost_at_loan_payoff']}
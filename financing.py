@@ -0,0 +1,62 @@
+import numpy as np
+
+from intermediate_vehicle import accrued_at, get_costs_batch
+from loan import compute_loan_cost_array
+
+
+def financing_grid(apr, loan_term, opp_cost_rate):
+    '''
+    every combination of the given apr, loan_term and opp_cost_rate values
+    returns three flat arrays, one entry per financing scenario
+    '''
+    grid = np.meshgrid(np.atleast_1d(np.asarray(apr, dtype=float)),
+                       np.atleast_1d(np.asarray(loan_term, dtype=float)),
+                       np.atleast_1d(np.asarray(opp_cost_rate, dtype=float)),
+                       indexing='ij')
+    return tuple(v.ravel() for v in grid)
+
+def _scenarios(*values):
+    return [v.ravel() for v in np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in values))]
+
+def financing_costs(car, apr, loan_term):
+    '''
+    get_costs for every financing scenario and vehicle
+    car is a get_costs_batch keyword dict with one row per vehicle, apr and
+    loan_term broadcast over scenarios and replace the car's own
+    returns initial_cost (scenarios, vehicles), usage_cost (vehicles,)
+
+    usage costs do not depend on financing and are computed once. loan
+    interest is linear in the price, so compute_loan_cost runs once per
+    unique (apr, loan_term) on a unit price and is scaled per vehicle
+    '''
+    apr, loan_term = _scenarios(apr, loan_term)
+    unique, inverse = np.unique(np.stack([apr, loan_term], axis=1), axis=0, return_inverse=True)
+    interest_per_dollar = compute_loan_cost_array(1.0, unique[:, 0] / 12, unique[:, 1])[inverse.ravel()]
+
+    # with apr 0 initial_cost is the taxed price alone
+    purchase_cost_with_tax, usage_cost = get_costs_batch(**dict(car, apr=0.0))
+    initial_cost = purchase_cost_with_tax * (1 + interest_per_dollar[:, None])
+    return initial_cost, usage_cost
+
+def accrued_cost_scenarios(car, apr, loan_term, opp_cost_rate, num_years):
+    '''
+    cost_compare's a_accrued after num_years for every financing scenario
+    and vehicle, shape (scenarios, vehicles); loan_term must be a year multiple
+    '''
+    apr, loan_term, opp_cost_rate = _scenarios(apr, loan_term, opp_cost_rate)
+    assert np.all(loan_term % 12 == 0) # loan term must be year multiple
+    initial_cost, usage_cost = financing_costs(car, apr, loan_term)
+    return accrued_at(initial_cost, usage_cost, loan_term[:, None] / 12, opp_cost_rate[:, None], float(num_years))
+
+def cost_compare_scenarios(car_a, car_b, apr, loan_term, opp_cost_rate, num_years):
+    '''
+    cost_compare for many (A, B) pairs under every financing scenario at once
+    car_a and car_b are get_costs_batch keyword dicts with one row per pair
+    returns dict of (scenarios, pairs) arrays: net_gain_a, a_accrued, b_accrued
+    '''
+    apr, loan_term, opp_cost_rate = _scenarios(apr, loan_term, opp_cost_rate)
+    a_accrued = accrued_cost_scenarios(car_a, apr, loan_term, opp_cost_rate, num_years)
+    b_accrued = accrued_cost_scenarios(car_b, apr, loan_term, opp_cost_rate, num_years)
+    return {'net_gain_a': (1 + (opp_cost_rate[:, None]-1)/2) * (a_accrued - b_accrued),
+            'a_accrued': a_accrued,
+            'b_accrued': b_accrued}
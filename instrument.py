@@ -0,0 +1,107 @@
+'''
+opt-in per stage timing and allocation tracking
+
+set VEHICLE_CALC_PROFILE before importing the models, to a json path or to
+"stderr"; VEHICLE_CALC_PROFILE_MEMORY=0 skips tracemalloc. when the variable
+is unset timed() returns functions untouched and stage() a shared no-op
+context, so disabled instrumentation costs nothing measurable
+'''
+import atexit
+import contextlib
+import functools
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+
+PROFILE = os.environ.get('VEHICLE_CALC_PROFILE', '')
+ENABLED = bool(PROFILE)
+TRACK_MEMORY = ENABLED and os.environ.get('VEHICLE_CALC_PROFILE_MEMORY', '1') != '0'
+
+_NULL = contextlib.nullcontext()
+_stats = {}
+_stack = []
+
+
+class _Stage(object):
+
+    __slots__ = ('name', 'start', 'mem_start', 'peak')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        if TRACK_MEMORY:
+            current, peak = tracemalloc.get_traced_memory()
+            if _stack:
+                # the parent's peak so far would be lost by the reset
+                _stack[-1].peak = max(_stack[-1].peak, peak)
+            tracemalloc.reset_peak()
+            self.mem_start = current
+            self.peak = current
+        _stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        _stack.pop()
+        stats = _stats.get(self.name)
+        if stats is None:
+            stats = _stats[self.name] = {'calls': 0, 'seconds': 0.0, 'peak_alloc_bytes': 0}
+        stats['calls'] += 1
+        stats['seconds'] += elapsed
+        if TRACK_MEMORY:
+            peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            stats['peak_alloc_bytes'] = max(stats['peak_alloc_bytes'], peak - self.mem_start)
+            if _stack:
+                _stack[-1].peak = max(_stack[-1].peak, peak)
+        return False
+
+
+def stage(name):
+    '''
+    with stage('vehicle_cost.print'): ...
+    '''
+    return _Stage(name) if ENABLED else _NULL
+
+def timed(name):
+    '''
+    decorator recording every call of the function as a stage
+    '''
+    def decorate(func):
+        if not ENABLED:
+            return func
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def report():
+    '''
+    stage -> calls, seconds, mean_seconds, peak_alloc_bytes
+    '''
+    return {name: dict(stats, mean_seconds=stats['seconds'] / stats['calls'])
+            for name, stats in sorted(_stats.items())}
+
+def reset():
+    _stats.clear()
+
+def dump(path = None):
+    path = path or PROFILE
+    text = json.dumps({'memory_tracked': TRACK_MEMORY, 'stages': report()}, indent=1)
+    if path in ('stderr', '1'):
+        print(text, file=sys.stderr)
+    else:
+        with open(path, 'w') as f:
+            f.write(text)
+
+
+if ENABLED:
+    if TRACK_MEMORY:
+        tracemalloc.start()
+    atexit.register(dump)
@@ -1,8 +1,16 @@
+import difflib
+
+import numpy as np
+
+import instrument
+from loan import compute_loan_cost, compute_loan_cost_array
+from vehicle_cost import get_fuel_cost_batch
 
 def get_selling_amt(purchase_cost, depreciation_coef, years_own):
     depreciation_amt = depreciation_coef**years_own
     return purchase_cost * depreciation_amt
 
+@instrument.timed('intermediate_vehicle.fuel')
 def get_fuel_cost(mpg, total_miles, fuel_price_per_gal, mpkw, elec_cost, elec_pct):
     if elec_pct < 1.0:
         gallons_used = (1.0*total_miles) / mpg
@@ -14,16 +22,7 @@ def get_fuel_cost(mpg, total_miles, fuel_price_per_gal, mpkw, elec_cost, elec_pc
 
     return fuel_cost + elec_cost
 
-def compute_loan_cost(P, r, n):
-    '''
-    P, principal
-    r, monthly APR
-    n, total number of months
-    '''
-    monthly_payment = P * (r * (1+r)**n) / ((1+r)**n - 1)
-    interest = monthly_payment * n - P
-    return interest
-
+@instrument.timed('intermediate_vehicle.get_costs')
 def get_costs(all_cars,
               name,
               purchase_cost_no_tax,
@@ -52,16 +51,69 @@ def get_costs(all_cars,
 
     all_cars[name] = [initial_cost, usage_cost]
 
+@instrument.timed('intermediate_vehicle.get_costs_batch')
+def get_costs_batch(purchase_cost_no_tax,
+                    tax_rate,
+                    miles_per_year,
+                    insurance_rate,
+                    starting_mileage,
+                    mpg,
+                    fuel_price,
+                    vehicle_life_in_miles,
+                    maintenance_per_year,
+                    apr = 0.02,
+                    loan_term = 36,
+                    elec_cost = 1.0,
+                    elec_pct = 0.0,
+                    mpkw = 0.1):
+    '''
+    vectorized get_costs, one row per vehicle
+    returns initial_cost, usage_cost arrays
+    '''
+    purchase_cost_with_tax = np.asarray(purchase_cost_no_tax, dtype=float) * tax_rate
+    interest_cost = compute_loan_cost_array(purchase_cost_with_tax, np.asarray(apr, dtype=float) / 12, loan_term)
+
+    insurance_cost = np.asarray(insurance_rate, dtype=float) * 2
+    fuel_cost = get_fuel_cost_batch(mpg, miles_per_year, fuel_price, mpkw, elec_cost, elec_pct)
+
+    initial_cost = purchase_cost_with_tax + interest_cost
+    usage_cost = fuel_cost + maintenance_per_year + insurance_cost
+    return np.broadcast_arrays(initial_cost, usage_cost)
+
+class VehicleNotFoundError(KeyError):
+    '''
+    suggestions is a list of close names or a callable returning one; a
+    callable only runs when the suggestions are read, so misses that are
+    caught and handled never pay for a fuzzy search
+    '''
+
+    def __init__(self, name, suggestions = ()):
+        KeyError.__init__(self, name)
+        self.name = name
+        self._suggestions = suggestions
+
+    @property
+    def suggestions(self):
+        if callable(self._suggestions):
+            self._suggestions = self._suggestions()
+        return list(self._suggestions)
+
+    def __str__(self):
+        message = "name \"{}\" not found".format(self.name)
+        if self.suggestions:
+            message += ", did you mean {}?".format(", ".join('"{}"'.format(s) for s in self.suggestions))
+        return message
 
 def select_car(all_cars, name):
     try:
         initial_cost, usage_cost = all_cars[name]
         return initial_cost, usage_cost
-    except Exception as e:
-        print(e)
-        print("name \"{}\" not found".format(name))
-        exit()
+    except VehicleNotFoundError:
+        raise
+    except KeyError:
+        raise VehicleNotFoundError(name, lambda: difflib.get_close_matches(name, list(all_cars), n=3))
 
+@instrument.timed('intermediate_vehicle.cost_compare')
 def cost_compare(all_cars, carA, carB, loan_term, num_years, opp_cost_rate):
     '''
     ica is initial cost A
@@ -96,28 +148,229 @@ def cost_compare(all_cars, carA, carB, loan_term, num_years, opp_cost_rate):
 
         net_gain_a += year_total
 
-        print("{:4d}:  {:5.1f} {:6.1f}  {:6.1f} {:5.1f}  {:7.1f} {:6.1f}".format(
-                i+1,
-                year_cost_a/1000,
-                year_cost_b/1000,
-                year_ab_diff/1000,
-                year_accrued_interest/1000,
-                year_total/1000,
-                net_gain_a/1000))
+        with instrument.stage('intermediate_vehicle.print'):
+            print("{:4d}:  {:5.1f} {:6.1f}  {:6.1f} {:5.1f}  {:7.1f} {:6.1f}".format(
+                    i+1,
+                    year_cost_a/1000,
+                    year_cost_b/1000,
+                    year_ab_diff/1000,
+                    year_accrued_interest/1000,
+                    year_total/1000,
+                    net_gain_a/1000))
 
         a_accrued = a_accrued*opp_cost_rate + year_cost_a
         b_accrued = b_accrued*opp_cost_rate + year_cost_b
 
     n = max(len(carA), len(carB))
 
-    print("\nTotal Cost:")
-    print("{1:{0}}:  ${2:5.1f}k".format(n, carA, a_accrued/1000))
-    print("{1:{0}}:  ${2:5.1f}k".format(n, carB, b_accrued/1000))
+    with instrument.stage('intermediate_vehicle.print'):
+        print("\nTotal Cost:")
+        print("{1:{0}}:  ${2:5.1f}k".format(n, carA, a_accrued/1000))
+        print("{1:{0}}:  ${2:5.1f}k".format(n, carB, b_accrued/1000))
+
+        print("\nAvg cost / year:")
+        print("{1:{0}}:  ${2:5.1f}k".format(n, carA, a_accrued/1000/num_years))
+        print("{1:{0}}:  ${2:5.1f}k".format(n, carB, b_accrued/1000/num_years))
+
+@instrument.timed('intermediate_vehicle.cost_compare_batch')
+def cost_compare_batch(ica, uca, icb, ucb, loan_term, num_years, opp_cost_rate):
+    '''
+    cost_compare for many (A, B) pairs at once without printing
+    every argument is an array over pairs or a scalar, num_years may differ per pair
+    returns dict of arrays: net_gain_a, a_accrued, b_accrued at each pair's num_years
+    '''
+    ica, uca, icb, ucb, loan_term, num_years, opp_cost_rate = np.broadcast_arrays(
+            *(np.asarray(v, dtype=float) for v in (ica, uca, icb, ucb, loan_term, num_years, opp_cost_rate)))
+    assert np.all(loan_term % 12 == 0) # loan term must be year multiple
 
-    print("\nAvg cost / year:")
-    print("{1:{0}}:  ${2:5.1f}k".format(n, carA, a_accrued/1000/num_years))
-    print("{1:{0}}:  ${2:5.1f}k".format(n, carB, b_accrued/1000/num_years))
+    pct_accrue_per_year = 12.0 / loan_term
+    ica_year = ica * pct_accrue_per_year
+    icb_year = icb * pct_accrue_per_year
 
+    net_gain_a = np.zeros(ica.shape)
+    a_accrued = np.zeros(ica.shape)
+    b_accrued = np.zeros(ica.shape)
+    result = {'net_gain_a': np.zeros(ica.shape),
+              'a_accrued': np.zeros(ica.shape),
+              'b_accrued': np.zeros(ica.shape)}
+
+    for i in range(int(num_years.max(initial=0))):
+        paying_loan = i*12 < loan_term
+        year_cost_a = np.where(paying_loan, ica_year, 0) + uca
+        year_cost_b = np.where(paying_loan, icb_year, 0) + ucb
+
+        year_ab_diff = year_cost_a - year_cost_b
+        year_accrued_interest = (opp_cost_rate-1) * (net_gain_a + year_ab_diff/2)
+        year_total = year_ab_diff + year_accrued_interest
+
+        net_gain_a = net_gain_a + year_total
+        a_accrued = a_accrued*opp_cost_rate + year_cost_a
+        b_accrued = b_accrued*opp_cost_rate + year_cost_b
+
+        done = num_years == i+1
+        result['net_gain_a'][done] = net_gain_a[done]
+        result['a_accrued'][done] = a_accrued[done]
+        result['b_accrued'][done] = b_accrued[done]
+
+    return result
+
+def accrued_cost(initial_cost, usage_cost, loan_term, num_years, opp_cost_rate):
+    '''
+    a_accrued of cost_compare for every vehicle, vectorized over vehicles and years
+
+    the loan is paid over the first loan_term/12 years, every year's cost
+    then compounds at opp_cost_rate until num_years
+    '''
+    assert (loan_term%12) == 0 # loan term must be year multiple
+    years = np.arange(num_years)
+    weights = float(opp_cost_rate) ** (num_years - 1 - years)
+    loan_weights = np.where(years*12 < loan_term, weights, 0.0).sum()
+    initial_cost_year = np.asarray(initial_cost, dtype=float) * (12.0 / loan_term)
+    return initial_cost_year * loan_weights + np.asarray(usage_cost, dtype=float) * weights.sum()
+
+def _geometric_sum(opp_cost_rate, count):
+    '''
+    sum of opp_cost_rate**k for k in range(count), stable near a rate of 1
+    '''
+    growth = opp_cost_rate - 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        total = np.expm1(count * np.log1p(growth)) / growth
+    return np.where(growth == 0, count, total)
+
+def accrued_at(initial_cost, usage_cost, loan_years, opp_cost_rate, horizon):
+    '''
+    cost_compare's a_accrued after horizon years in closed form, every
+    argument broadcasts against the others
+
+    initial_cost and usage_cost are get_costs outputs, loan_years is the loan
+    term in years (loan_term / 12) and horizon may be fractional, which is
+    what break_even_years solves over. matches the yearly loop for whole
+    horizons and year multiple loan terms
+    '''
+    paid_years = np.minimum(horizon, loan_years)
+    usage_weight = _geometric_sum(opp_cost_rate, horizon)
+    loan_weight = opp_cost_rate ** (horizon - paid_years) * _geometric_sum(opp_cost_rate, paid_years)
+    return initial_cost / loan_years * loan_weight + usage_cost * usage_weight
+
+def accrued_cost_horizons(initial_cost, usage_cost, loan_term, opp_cost_rate, max_years = 50):
+    '''
+    accrued_cost for every num_years in 1..max_years in closed form, shape (..., max_years)
+
+    a year t cost compounds opp_cost_rate**(T-1-t) by year T, so the usage part
+    is a geometric sum over T years and the loan part one over the first
+    min(T, loan_term/12) years scaled by opp_cost_rate**(T - that)
+    '''
+    assert np.all(np.asarray(loan_term) % 12 == 0) # loan term must be year multiple
+    horizon = np.arange(1, max_years + 1, dtype=float)
+    return accrued_at(np.asarray(initial_cost, dtype=float)[..., None],
+                      np.asarray(usage_cost, dtype=float)[..., None],
+                      np.asarray(loan_term, dtype=float)[..., None] / 12,
+                      np.asarray(opp_cost_rate, dtype=float)[..., None],
+                       horizon)
+
+def cost_compare_horizons(ica, uca, icb, ucb, loan_term, opp_cost_rate, max_years = 50):
+    '''
+    cost_compare for every num_years in 1..max_years at once, O(1) per horizon
+    arguments broadcast over pairs, results have shape (..., max_years)
+    returns dict of arrays: net_gain_a, a_accrued, b_accrued
+    '''
+    a_accrued = accrued_cost_horizons(ica, uca, loan_term, opp_cost_rate, max_years)
+    b_accrued = accrued_cost_horizons(icb, ucb, loan_term, opp_cost_rate, max_years)
+    gain_factor = 1 + (np.asarray(opp_cost_rate, dtype=float)[..., None] - 1) / 2
+    return {'net_gain_a': gain_factor * (a_accrued - b_accrued),
+            'a_accrued': a_accrued,
+            'b_accrued': b_accrued}
+
+def break_even_years(ica, uca, icb, ucb, loan_term, opp_cost_rate, max_years = 50, tol = 1e-9):
+    '''
+    fractional year where cost_compare's net_gain_a first changes sign, for
+    many (A, B) pairs at once; inf where it keeps its year 1 sign through max_years
+
+    the yearly net_gain_a brackets the first crossing between two whole years,
+    which is then bisected on the closed form continued to fractional horizons
+    (it matches the recurrence at every whole year). arguments broadcast over pairs
+    '''
+    ica, uca, icb, ucb, loan_term, opp_cost_rate = np.broadcast_arrays(
+            *(np.asarray(v, dtype=float) for v in (ica, uca, icb, ucb, loan_term, opp_cost_rate)))
+    net_gain_a = cost_compare_horizons(ica, uca, icb, ucb, loan_term, opp_cost_rate, max_years)['net_gain_a']
+    sign = np.sign(net_gain_a)
+    first = sign[..., 0]
+    crossed = (sign != first[..., None]) & (first[..., None] != 0)
+    found = crossed.any(axis=-1)
+
+    # only pairs that cross are bisected
+    ica, uca, icb, ucb, loan_term, opp_cost_rate, first = (v[found] for v in (ica, uca, icb, ucb, loan_term, opp_cost_rate, first))
+    loan_years = loan_term / 12
+    gain_factor = 1 + (opp_cost_rate - 1) / 2
+    def net_gain_at(horizon):
+        return gain_factor * (accrued_at(ica, uca, loan_years, opp_cost_rate, horizon)
+                              - accrued_at(icb, ucb, loan_years, opp_cost_rate, horizon))
+
+    # crossed[..., k] is year k+1 and year 1 never crosses, so the root is in [k, k+1]
+    lo = crossed[found].argmax(axis=-1).astype(float)
+    hi = lo + 1
+    for _ in range(int(np.ceil(np.log2(1 / tol)))):
+        mid = (lo + hi) / 2
+        same_side = np.sign(net_gain_at(mid)) == first
+        lo = np.where(same_side, mid, lo)
+        hi = np.where(same_side, hi, mid)
+
+    years = np.full(found.shape, np.inf)
+    years[found] = hi
+    return years
+
+def _pair_tiles(accrued, opp_cost_rate, tile):
+    gain = (1 + (opp_cost_rate-1)/2) * accrued
+    n = len(gain)
+    for i in range(0, n, tile):
+        rows = slice(i, min(i + tile, n))
+        for j in range(0, n, tile):
+            cols = slice(j, min(j + tile, n))
+            yield rows, cols, gain[rows, None] - gain[None, cols]
+
+def iter_all_pairs(initial_cost, usage_cost, loan_term, num_years, opp_cost_rate, tile = 2048):
+    '''
+    yields (rows, cols, net_gain_a tile) covering the N x N matrix of cost_compare(A=row, B=col)
+
+    the yearly recurrence net = o*net + (1+o)/2 * diff is linear in the cost
+    difference, so net_gain_a[A, B] = (1+o)/2 * (a_accrued[A] - a_accrued[B]);
+    only one tile is materialized at a time
+    '''
+    accrued = accrued_cost(initial_cost, usage_cost, loan_term, num_years, opp_cost_rate)
+    return _pair_tiles(accrued, opp_cost_rate, tile)
+
+def cost_compare_all_pairs(initial_cost,
+                           usage_cost,
+                           loan_term,
+                           num_years,
+                           opp_cost_rate,
+                           names = None,
+                           out = None,
+                           tile = 2048,
+                           verbose = False):
+    '''
+    cost_compare for every ordered pair of vehicles
+    returns net_gain_a (N, N) with car A on rows, and a_accrued (N,)
+    b_accrued of a pair is a_accrued of its column vehicle
+
+    out = None allocates the whole N x N float64 result in memory (800 MB at
+    N = 10k); for bounded memory pass a memmap out (e.g. ResultStore.create)
+    or consume iter_all_pairs tile by tile
+    '''
+    accrued = accrued_cost(initial_cost, usage_cost, loan_term, num_years, opp_cost_rate)
+    n = len(accrued)
+    if out is None:
+        out = np.empty((n, n))
+    for rows, cols, block in _pair_tiles(accrued, opp_cost_rate, tile):
+        out[rows, cols] = block
+
+    if verbose:
+        names = names if names is not None else [str(i) for i in range(n)]
+        width = max(len(name) for name in names)
+        print("\nTotal Cost:")
+        for i in np.argsort(accrued):
+            print("{1:{0}}:  ${2:5.1f}k  ${3:5.1f}k/yr".format(width, names[i], accrued[i]/1000, accrued[i]/1000/num_years))
+    return out, accrued
 
 if __name__ == "__main__":
 
@@ -0,0 +1,171 @@
+import heapq
+from collections import namedtuple
+
+import numpy as np
+
+from vehicle_cost import format_summary
+
+
+Entry = namedtuple('Entry', ['name',
+                             'is_new',
+                             'cost_per_mile',
+                             'cost_per_year',
+                             'years_own',
+                             'selling_amt',
+                             'cost_at_loan_payoff'])
+
+SEGMENTS = ('all', 'new', 'used')
+
+
+class Leaderboard(object):
+    '''
+    bounded top-k of the cheapest vehicles by cost_per_mile, overall and per
+    new / used segment
+
+    each board is a max-heap of at most k numeric entries and rows are only
+    formatted when emitted. ties keep the earlier candidate, like
+    print_summary's stable sort
+
+    with track_ranks every candidate's cost_per_mile (float64) and segment
+    are also kept in flat arrays with a name -> row dict, so rank() works for
+    any name pushed. that costs about 9 bytes per candidate in the arrays plus
+    one dict entry (roughly 100 bytes with a short name string), so it is the
+    only part that grows with the candidates; track_ranks = False keeps the
+    leaderboard bounded and rank() limited to the current top k
+    '''
+
+    def __init__(self, k = 20, track_ranks = True):
+        self.k = k
+        self.pushed = 0
+        self.counts = {segment: 0 for segment in SEGMENTS}
+        self._boards = {segment: [] for segment in SEGMENTS}
+        self.track_ranks = track_ranks
+        self._rows = {}
+        self._costs = np.empty(1024)
+        self._is_new = np.empty(1024, dtype=bool)
+
+    def push(self,
+             name,
+             cost_per_mile,
+             cost_per_year,
+             years_own,
+             selling_amt,
+             cost_at_loan_payoff,
+             is_new = False):
+        entry = Entry(name,
+                      bool(is_new),
+                      float(cost_per_mile),
+                      float(cost_per_year),
+                      float(years_own),
+                      float(selling_amt),
+                      float(cost_at_loan_payoff))
+        self._push_entry(entry, self.pushed)
+        self._track([name], [entry.cost_per_mile], [entry.is_new])
+        self.pushed += 1
+        self.counts['all'] += 1
+        self.counts['new' if entry.is_new else 'used'] += 1
+
+    def push_result(self, result):
+        '''
+        push a vehicle_cost.VehicleResult
+        '''
+        self.push(result.name,
+                  result.cost_per_mile,
+                  result.cost_per_year,
+                  result.years_own,
+                  result.selling_amt,
+                  result.cost_at_loan_payoff,
+                  result.is_new)
+
+    def _track(self, names, cost_per_mile, is_new):
+        if not self.track_ranks:
+            return
+        start, stop = self.pushed, self.pushed + len(names)
+        if stop > len(self._costs):
+            capacity = max(stop, 2 * len(self._costs))
+            self._costs = np.resize(self._costs, capacity)
+            self._is_new = np.resize(self._is_new, capacity)
+        self._costs[start:stop] = cost_per_mile
+        self._is_new[start:stop] = is_new
+        self._rows.update(zip(names, range(start, stop)))
+
+    def _push_entry(self, entry, seq):
+        item = (-entry.cost_per_mile, -seq, entry)
+        self._offer('all', item)
+        self._offer('new' if entry.is_new else 'used', item)
+
+    def _offer(self, segment, item):
+        board = self._boards[segment]
+        if len(board) < self.k:
+            heapq.heappush(board, item)
+        elif item[0] > board[0][0]:
+            heapq.heapreplace(board, item)
+
+    def push_batch(self, names, results, is_new = False):
+        '''
+        push the rows of a main_batch result, only the k cheapest rows of each
+        segment in the batch are turned into entries
+        '''
+        cost_per_mile = np.asarray(results['cost_per_mile'])
+        is_new = np.broadcast_to(np.asarray(is_new, dtype=bool), cost_per_mile.shape)
+        keep = np.zeros(cost_per_mile.shape, dtype=bool)
+        for mask in (is_new, ~is_new):
+            rows = np.flatnonzero(mask)
+            if len(rows) > self.k:
+                # keep ties with the k-th cheapest so the earliest of them wins
+                kth = np.partition(cost_per_mile[rows], self.k - 1)[self.k - 1]
+                rows = rows[cost_per_mile[rows] <= kth]
+            keep[rows] = True
+        for i in np.flatnonzero(keep):
+            entry = Entry(names[i],
+                          bool(is_new[i]),
+                          float(cost_per_mile[i]),
+                          float(results['cost_per_year'][i]),
+                          float(results['years_own'][i]),
+                          float(results['selling_amt'][i]),
+                          float(results['cost_at_loan_payoff'][i]))
+            self._push_entry(entry, self.pushed + i)
+        self._track(names, cost_per_mile, is_new)
+        self.pushed += len(cost_per_mile)
+        self.counts['all'] += len(cost_per_mile)
+        self.counts['new'] += int(is_new.sum())
+        self.counts['used'] += len(cost_per_mile) - int(is_new.sum())
+
+    def top(self, segment = 'all'):
+        '''
+        entries of a segment, cheapest first
+        '''
+        return [item[2] for item in sorted(self._boards[segment], reverse = True)]
+
+    def rank(self, name, segment = 'all'):
+        '''
+        1-based rank of name among every candidate pushed to the segment,
+        ties ranked by push order; a name pushed twice counts its latest push
+
+        without track_ranks only names in the segment's top k can be ranked,
+        any other name raises KeyError
+        '''
+        if not self.track_ranks:
+            for i, entry in enumerate(self.top(segment)):
+                if entry.name == name:
+                    return i + 1
+            raise KeyError("name \"{}\" not in the top {} of the {} candidates of segment \"{}\"".format(
+                                name, self.k, self.counts[segment], segment))
+
+        row = self._rows.get(name)
+        if row is None or (segment != 'all' and self._is_new[row] != (segment == 'new')):
+            raise KeyError("name \"{}\" was not pushed to segment \"{}\"".format(name, segment))
+        costs = self._costs[:self.pushed]
+        cost = costs[row]
+        ahead = (costs < cost)
+        ahead[:row] |= costs[:row] == cost
+        if segment != 'all':
+            ahead &= self._is_new[:self.pushed] == (segment == 'new')
+        return int(ahead.sum()) + 1
+
+    def rows(self, segment = 'all'):
+        return [format_summary(*entry) for entry in self.top(segment)]
+
+    def print_summary(self, segment = 'all'):
+        for row in self.rows(segment):
+            print(row)
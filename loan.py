@@ -0,0 +1,48 @@
+import functools
+
+import numpy as np
+
+import instrument
+
+
+LOAN_CACHE_SIZE = 4096
+
+
+@functools.lru_cache(maxsize=LOAN_CACHE_SIZE)
+def _compute_loan_cost(P, r, n):
+    '''
+    P, principal
+    r, monthly APR
+    n, total number of months
+
+    memoized, see loan_cache_info for hit/miss counts
+    '''
+    if r == 0:
+        return 0.0
+    monthly_payment = P * (r * (1+r)**n) / ((1+r)**n - 1)
+    interest = monthly_payment * n - P
+    return interest
+
+compute_loan_cost = instrument.timed('loan.compute_loan_cost')(_compute_loan_cost)
+
+@instrument.timed('loan.compute_loan_cost_array')
+def compute_loan_cost_array(P, r, n):
+    '''
+    compute_loan_cost over broadcast arrays of P, r, n
+    '''
+    P, r, n = np.broadcast_arrays(np.asarray(P, dtype=float),
+                                  np.asarray(r, dtype=float),
+                                  np.asarray(n, dtype=float))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        monthly_payment = P * (r * (1+r)**n) / ((1+r)**n - 1)
+        interest = monthly_payment * n - P
+    return np.where(r == 0, 0.0, interest)
+
+def loan_cache_info():
+    '''
+    hits, misses, maxsize and currsize of the scalar memo
+    '''
+    return _compute_loan_cost.cache_info()
+
+def loan_cache_clear():
+    _compute_loan_cost.cache_clear()
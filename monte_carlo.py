@@ -0,0 +1,141 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from vehicle_cost import main_batch
+
+
+def draw_inputs(rng, vehicles, distributions, n_draws):
+    '''
+    distributions maps a main_batch parameter to (generator method, *args),
+    e.g. {'fuel_price': ('normal', 3.5, 0.4), 'miles_per_year': ('uniform', 8e3, 15e3)}
+
+    scalar args draw one value per scenario shared by every vehicle (so fuel
+    price shocks hit all cars alike); per-vehicle array args draw independently
+    for each vehicle
+    returns main_batch inputs of shape (n_draws, n_vehicles)
+    '''
+    inputs = {k: np.asarray(v, dtype=float) for k, v in vehicles.items()}
+    for k in sorted(distributions):
+        method, *args = distributions[k]
+        per_vehicle = max([np.size(a) for a in args] + [1])
+        inputs[k] = getattr(rng, method)(*args, size=(n_draws, per_vehicle))
+    return inputs
+
+def _simulate_costs(vehicles, distributions, n_draws, seed_seq):
+    rng = np.random.default_rng(seed_seq)
+    inputs = draw_inputs(rng, vehicles, distributions, n_draws)
+    cost_per_mile = main_batch(**inputs)['cost_per_mile']
+    return np.broadcast_to(cost_per_mile, (n_draws, np.shape(cost_per_mile)[-1]))
+
+def _simulate_chunk(vehicles, distributions, n_draws, seed_seq, lo, hi, bins):
+    '''
+    mergeable summary of one chunk: per vehicle histogram over bins equal
+    bins between lo and hi plus an underflow and an overflow bin, sum, min,
+    max, and the pairwise win counts; no draw leaves the worker
+    '''
+    cost_per_mile = _simulate_costs(vehicles, distributions, n_draws, seed_seq)
+    n_vehicles = cost_per_mile.shape[1]
+    # one row of the win matrix at a time keeps the temporary at n_draws x n_vehicles
+    wins = np.empty((n_vehicles, n_vehicles), dtype=np.int64)
+    for a in range(n_vehicles):
+        wins[a] = (cost_per_mile[:, a:a+1] < cost_per_mile).sum(axis=0)
+
+    position = (cost_per_mile - lo) / ((hi - lo) / bins)
+    position = np.where(np.isnan(position), bins, position)
+    index = np.clip(np.floor(position), -1, bins).astype(np.intp) + 1
+    index += np.arange(n_vehicles) * (bins + 2)
+    counts = np.bincount(index.ravel(), minlength=n_vehicles * (bins + 2)).reshape(n_vehicles, bins + 2)
+    return {'counts': counts,
+            'sum': cost_per_mile.sum(axis=0),
+            'min': cost_per_mile.min(axis=0),
+            'max': cost_per_mile.max(axis=0),
+            'wins': wins}
+
+def _merge(summaries):
+    total = None
+    for summary in summaries:
+        if total is None:
+            total = dict(summary)
+            continue
+        for k in ('counts', 'sum', 'wins'):
+            total[k] = total[k] + summary[k]
+        total['min'] = np.minimum(total['min'], summary['min'])
+        total['max'] = np.maximum(total['max'], summary['max'])
+    return total
+
+def histogram_percentiles(counts, lo, hi, vmin, vmax, percentiles):
+    '''
+    percentiles per vehicle from _simulate_chunk histograms, linear within a
+    bin, so within one bin width (hi - lo) / bins of the exact value; the
+    underflow / overflow bins span [vmin, lo] and [hi, vmax]
+    returns (len(percentiles), n_vehicles)
+    '''
+    n_vehicles, n_bins = counts.shape
+    bins = n_bins - 2
+    lo, hi, vmin, vmax = np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in (lo, hi, vmin, vmax)))
+    inner = lo[:, None] + (hi - lo)[:, None] * np.linspace(0, 1, bins + 1)
+    edges = np.concatenate([np.minimum(vmin, lo)[:, None], inner, np.maximum(vmax, hi)[:, None]], axis=1)
+    cumulative = np.cumsum(counts, axis=1)
+    result = np.empty((len(percentiles), n_vehicles))
+    for v in range(n_vehicles):
+        target = np.asarray(percentiles, dtype=float) / 100 * cumulative[v, -1]
+        j = np.minimum(np.searchsorted(cumulative[v], target), n_bins - 1)
+        before = cumulative[v, j] - counts[v, j]
+        fraction = np.where(counts[v, j] > 0, (target - before) / np.maximum(counts[v, j], 1), 0.0)
+        result[:, v] = edges[v, j] + fraction * (edges[v, j + 1] - edges[v, j])
+    return result
+
+def simulate(vehicles,
+             distributions,
+             n_draws,
+             seed = 0,
+             percentiles = (5, 50, 95),
+             n_workers = None,
+             chunk_draws = 1 << 15,
+             bins = 4096,
+             pilot_draws = 4096):
+    '''
+    Monte Carlo cost_per_mile for every vehicle under uncertain inputs
+
+    draws are split into fixed chunks, each with its own SeedSequence child, so
+    results depend only on seed, chunk_draws and bins, not on the number of
+    workers. n_workers = 1 runs in process
+
+    workers send back only fixed size summaries (histograms, sums, win
+    counts), so memory and traffic do not grow with n_draws. the histogram
+    range per vehicle comes from pilot_draws extra draws, widened by half
+    their spread on each side; percentiles are within one bin width
+    (about spread / (bins / 2)) of the exact sample percentiles
+    returns dict with 'percentiles' (len(percentiles), n_vehicles), 'mean',
+    'min', 'max' and 'p_beats' where p_beats[a, b] = P(cost_per_mile a < cost_per_mile b)
+    '''
+    chunks = [min(chunk_draws, n_draws - start) for start in range(0, n_draws, chunk_draws)]
+    pilot_seed, *seeds = np.random.SeedSequence(seed).spawn(len(chunks) + 1)
+    n_workers = n_workers or os.cpu_count() or 1
+
+    pilot = _simulate_costs(vehicles, distributions, pilot_draws, pilot_seed)
+    low, high = pilot.min(axis=0), pilot.max(axis=0)
+    spread = np.maximum(high - low, 1e-9 * np.maximum(np.abs(high), 1.0))
+    lo, hi = low - spread / 2, high + spread / 2
+
+    n = len(chunks)
+    args = ([vehicles] * n, [distributions] * n, chunks, seeds, [lo] * n, [hi] * n, [bins] * n)
+    if n_workers == 1:
+        total = _merge(map(_simulate_chunk, *args))
+    else:
+        with ProcessPoolExecutor(n_workers) as pool:
+            total = _merge(pool.map(_simulate_chunk, *args))
+
+    return {'percentiles': histogram_percentiles(total['counts'], lo, hi, total['min'], total['max'], percentiles),
+            'mean': total['sum'] / n_draws,
+            'min': total['min'],
+            'max': total['max'],
+            'p_beats': total['wins'] / float(n_draws)}
+
+def prob_a_beats_b(result, names, carA, carB):
+    '''
+    probability that carA has the lower cost_per_mile
+    '''
+    return result['p_beats'][names.index(carA), names.index(carB)]
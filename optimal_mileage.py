@@ -0,0 +1,70 @@
+import numpy as np
+
+from vehicle_cost import main_batch
+
+
+INV_GOLDEN = (np.sqrt(5.0) - 1) / 2
+
+
+def _cost_per_mile(vehicles, selling_mileage):
+    return main_batch(**dict(vehicles, selling_mileage=selling_mileage))['cost_per_mile']
+
+def optimal_selling_mileage(vehicles,
+                            lower = None,
+                            upper = None,
+                            tol = 1.0,
+                            max_iter = 200):
+    '''
+    selling mileage minimizing cost_per_mile for every vehicle at once
+
+    vehicles, dict of main_batch column arrays, any selling_mileage is ignored
+    lower, upper, search bracket in miles; defaults to one year of driving
+    past starting_mileage up to vehicle_life_miles (at least two years out)
+    tol, bracket width in miles at which a vehicle stops iterating
+
+    golden-section search, all vehicles step together and a converged
+    vehicle's bracket stays frozen
+    returns dict of arrays: selling_mileage, cost_per_mile, iterations
+    '''
+    vehicles = {k: v for k, v in vehicles.items() if k != 'selling_mileage'}
+    starting_mileage = np.asarray(vehicles['starting_mileage'], dtype=float)
+    miles_per_year = np.asarray(vehicles['miles_per_year'], dtype=float)
+    vehicle_life_miles = np.asarray(vehicles.get('vehicle_life_miles', 250000), dtype=float)
+    if lower is None:
+        lower = starting_mileage + miles_per_year
+    if upper is None:
+        upper = np.maximum(vehicle_life_miles, starting_mileage + 2 * miles_per_year)
+
+    shape = np.shape(_cost_per_mile(vehicles, upper))
+    a = np.broadcast_to(np.asarray(lower, dtype=float), shape).copy()
+    b = np.broadcast_to(np.asarray(upper, dtype=float), shape).copy()
+    x1 = b - INV_GOLDEN * (b - a)
+    x2 = a + INV_GOLDEN * (b - a)
+    f1 = _cost_per_mile(vehicles, x1)
+    f2 = _cost_per_mile(vehicles, x2)
+    iterations = np.zeros(shape, dtype=int)
+
+    for _ in range(max_iter):
+        active = (b - a) > tol
+        if not active.any():
+            break
+        iterations += active
+        left = f1 < f2
+
+        # minimum in [a, x2]: old x1 becomes the new x2
+        b = np.where(active & left, x2, b)
+        # minimum in [x1, b]: old x2 becomes the new x1
+        a = np.where(active & ~left, x1, a)
+
+        x_new = np.where(left, b - INV_GOLDEN * (b - a), a + INV_GOLDEN * (b - a))
+        f_new = _cost_per_mile(vehicles, x_new)
+
+        x1, x2, f1, f2 = (np.where(active & left, x_new, np.where(active, x2, x1)),
+                          np.where(active & left, x1, np.where(active, x_new, x2)),
+                          np.where(active & left, f_new, np.where(active, f2, f1)),
+                          np.where(active & left, f1, np.where(active, f_new, f2)))
+
+    best = f1 < f2
+    return {'selling_mileage': np.where(best, x1, x2),
+            'cost_per_mile': np.where(best, f1, f2),
+            'iterations': iterations}
@@ -0,0 +1,80 @@
+import numpy as np
+
+from catalog_loader import model_fields
+from intermediate_vehicle import accrued_at, get_costs_batch
+from vehicle_cost import get_fuel_cost_batch
+
+
+FIELDS = model_fields(get_costs_batch)
+
+
+def _spec(car, k):
+    return np.asarray(car.get(k, FIELDS[k]), dtype=float)
+
+def _path(path):
+    '''
+    (years,) or (scenarios, years) price path -> (scenarios, 1, years)
+    '''
+    path = np.asarray(path, dtype=float)
+    return path.reshape((-1, 1, path.shape[-1]))
+
+def price_exposure(miles_per_year, mpg, elec_pct = 0.0, mpkw = 0.1):
+    '''
+    gallons and kwh bought per year, so that a year's fuel cost is
+    gallons * fuel_price + kwh * elec_cost exactly as in get_costs
+    '''
+    gallons = get_fuel_cost_batch(mpg, miles_per_year, 1.0, mpkw, 0.0, elec_pct)
+    kwh = get_fuel_cost_batch(mpg, miles_per_year, 0.0, mpkw, 1.0, elec_pct)
+    return gallons, kwh
+
+def usage_cost_paths(fuel_price_path, elec_cost_path, **car):
+    '''
+    get_costs usage_cost of every vehicle in every year of every price
+    scenario, shape (scenarios, vehicles, years)
+
+    fuel_price_path and elec_cost_path are (scenarios, years) or (years,);
+    car holds get_costs_batch keyword columns over vehicles, its fuel_price
+    and elec_cost are replaced by the paths
+    '''
+    gallons, kwh = price_exposure(_spec(car, 'miles_per_year'), _spec(car, 'mpg'), _spec(car, 'elec_pct'), _spec(car, 'mpkw'))
+    fixed = _spec(car, 'maintenance_per_year') + _spec(car, 'insurance_rate') * 2
+    column = lambda v: np.reshape(v, (-1, 1))
+    return column(fixed) + column(gallons) * _path(fuel_price_path) + column(kwh) * _path(elec_cost_path)
+
+def accrued_cost_paths(fuel_price_path, elec_cost_path, num_years, opp_cost_rate, **car):
+    '''
+    cost_compare's a_accrued after num_years for every scenario and vehicle
+    with usage costs following the price paths, shape (scenarios, vehicles)
+
+    a year's usage cost is linear in that year's prices, so compounding
+    reduces every path to one weighted sum over years (scenarios x years
+    work) and the (scenarios, vehicles, years) cube is never built
+    paths need at least num_years years, loan_term must be a year multiple
+    '''
+    loan_term = _spec(car, 'loan_term')
+    assert np.all(loan_term % 12 == 0) # loan term must be year multiple
+    opp_cost_rate = float(opp_cost_rate)
+
+    # the paths set the fuel cost, initial_cost does not depend on fuel_price
+    initial_cost, _ = get_costs_batch(**dict(car, fuel_price=0.0))
+    loan_accrued = accrued_at(initial_cost, 0.0, loan_term / 12, opp_cost_rate, float(num_years))
+
+    weights = opp_cost_rate ** (num_years - 1 - np.arange(num_years))
+    fuel_accrued = _path(fuel_price_path)[..., :num_years] @ weights
+    elec_accrued = _path(elec_cost_path)[..., :num_years] @ weights
+
+    gallons, kwh = price_exposure(_spec(car, 'miles_per_year'), _spec(car, 'mpg'), _spec(car, 'elec_pct'), _spec(car, 'mpkw'))
+    fixed = _spec(car, 'maintenance_per_year') + _spec(car, 'insurance_rate') * 2
+    return loan_accrued + fixed * weights.sum() + gallons * fuel_accrued + kwh * elec_accrued
+
+def cost_compare_paths(car_a, car_b, fuel_price_path, elec_cost_path, num_years, opp_cost_rate):
+    '''
+    cost_compare for many (A, B) pairs under every price scenario at once
+    car_a and car_b are get_costs_batch keyword dicts with one row per pair
+    returns dict of (scenarios, pairs) arrays: net_gain_a, a_accrued, b_accrued
+    '''
+    a_accrued = accrued_cost_paths(fuel_price_path, elec_cost_path, num_years, opp_cost_rate, **car_a)
+    b_accrued = accrued_cost_paths(fuel_price_path, elec_cost_path, num_years, opp_cost_rate, **car_b)
+    return {'net_gain_a': (1 + (opp_cost_rate-1)/2) * (a_accrued - b_accrued),
+            'a_accrued': a_accrued,
+            'b_accrued': b_accrued}
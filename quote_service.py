@@ -0,0 +1,243 @@
+import argparse
+import asyncio
+import collections
+import json
+import time
+
+import numpy as np
+
+from catalog_loader import REQUIRED, model_fields
+from intermediate_vehicle import cost_compare_batch, get_costs_batch
+from vehicle_cost import main_batch
+
+
+MAX_BODY = 1 << 20
+MAX_YEARS = 100
+LATENCY_WINDOW = 10000
+
+REASONS = {200: 'OK',
+           400: 'Bad Request',
+           404: 'Not Found',
+           405: 'Method Not Allowed',
+           413: 'Payload Too Large',
+           500: 'Internal Server Error'}
+
+
+class RequestError(Exception):
+
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+
+
+def stack_rows(rows, model):
+    '''
+    list of keyword dicts -> model columns, missing optional fields take the
+    model default (nan for selling_amt so main_batch computes it)
+    '''
+    columns = {}
+    for k, default in model_fields(model).items():
+        if default is REQUIRED:
+            missing = [i for i, row in enumerate(rows) if k not in row]
+            if missing:
+                raise RequestError(400, "vehicle {} is missing \"{}\"".format(missing[0], k))
+        elif not any(k in row for row in rows):
+            continue
+        fill = np.nan if default is None else default
+        try:
+            columns[k] = np.array([row.get(k, fill) for row in rows], dtype=float)
+        except (TypeError, ValueError):
+            raise RequestError(400, "field \"{}\" must be a number".format(k))
+        # json numbers past the float range parse as inf
+        if np.isinf(columns[k]).any():
+            raise RequestError(400, "field \"{}\" must be a finite number".format(k))
+    return columns
+
+def finite_rows(results, n):
+    '''
+    model result columns -> n json rows, non-finite values become null
+    '''
+    return [{k: float(v[i]) if np.isfinite(v[i]) else None for k, v in results.items()} for i in range(n)]
+
+def _reject_constant(name):
+    raise ValueError("{} is not valid json".format(name))
+
+
+class MicroBatcher(object):
+    '''
+    coalesces requests arriving within window seconds into one call of
+    evaluate(list of payloads) -> list of results
+    '''
+
+    def __init__(self, evaluate, window = 0.002, max_batch = 4096):
+        self.evaluate = evaluate
+        self.window = window
+        self.max_batch = max_batch
+        self.batch_sizes = collections.Counter()
+        self._pending = []
+        self._flush_handle = None
+
+    async def submit(self, payload):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((payload, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        self.batch_sizes[len(pending)] += 1
+        try:
+            results = self.evaluate([payload for payload, _ in pending])
+        except Exception:
+            # one bad payload should not fail its neighbours, retry one by one
+            results = []
+            for payload, _ in pending:
+                try:
+                    results.append(self.evaluate([payload])[0])
+                except Exception as e:
+                    results.append(e)
+        for (_, future), result in zip(pending, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+def evaluate_tco(payloads):
+    '''
+    each payload is one main_batch keyword dict
+    '''
+    results = main_batch(**stack_rows(payloads, main_batch))
+    return finite_rows(results, len(payloads))
+
+def evaluate_compare(payloads):
+    '''
+    each payload is {"carA": get_costs kwargs, "carB": ..., "loan_term", "num_years", "opp_cost_rate"}
+    '''
+    for p in payloads:
+        for k in ('carA', 'carB', 'num_years'):
+            if k not in p:
+                raise RequestError(400, "compare request is missing \"{}\"".format(k))
+        for k in ('carA', 'carB'):
+            if not isinstance(p[k], dict):
+                raise RequestError(400, "\"{}\" must be a json object".format(k))
+        num_years = p['num_years']
+        if (isinstance(num_years, bool) or not isinstance(num_years, (int, float))
+                or not 1 <= num_years <= MAX_YEARS or num_years != int(num_years)):
+            raise RequestError(400, "num_years must be an integer from 1 to {}".format(MAX_YEARS))
+    cars = stack_rows([p['carA'] for p in payloads] + [p['carB'] for p in payloads], get_costs_batch)
+    initial_cost, usage_cost = get_costs_batch(**cars)
+    n = len(payloads)
+    try:
+        loan_term = np.array([p.get('loan_term', p['carA'].get('loan_term', 36)) for p in payloads], dtype=float)
+        num_years = np.array([p['num_years'] for p in payloads], dtype=float)
+        opp_cost_rate = np.array([p.get('opp_cost_rate', 1.04) for p in payloads], dtype=float)
+    except (TypeError, ValueError):
+        raise RequestError(400, "loan_term, num_years and opp_cost_rate must be numbers")
+    if np.any(loan_term % 12 != 0):
+        raise RequestError(400, "loan_term must be a multiple of 12")
+    results = cost_compare_batch(initial_cost[:n], usage_cost[:n], initial_cost[n:], usage_cost[n:],
+                                 loan_term, num_years, opp_cost_rate)
+    return finite_rows(results, n)
+
+
+class QuoteService(object):
+
+    def __init__(self, window = 0.002, max_batch = 4096):
+        self.batchers = {'/tco': MicroBatcher(evaluate_tco, window, max_batch),
+                         '/compare': MicroBatcher(evaluate_compare, window, max_batch)}
+        self.latency = {path: collections.deque(maxlen=LATENCY_WINDOW) for path in self.batchers}
+
+    def stats(self):
+        report = {}
+        for path, batcher in self.batchers.items():
+            latency = np.array(self.latency[path])
+            report[path] = {'requests': int(sum(k * v for k, v in batcher.batch_sizes.items())),
+                            'p50_ms': float(np.percentile(latency, 50) * 1000) if len(latency) else None,
+                            'p99_ms': float(np.percentile(latency, 99) * 1000) if len(latency) else None,
+                            'batch_sizes': {str(k): v for k, v in sorted(batcher.batch_sizes.items())}}
+        return report
+
+    async def route(self, method, path, body):
+        if path == '/stats':
+            return self.stats()
+        if path not in self.batchers:
+            raise RequestError(404, "no endpoint {}".format(path))
+        if method != 'POST':
+            raise RequestError(405, "{} expects POST".format(path))
+        try:
+            payload = json.loads(body or b'null', parse_constant=_reject_constant)
+        except ValueError as e:
+            raise RequestError(400, "invalid json: {}".format(e))
+        if not isinstance(payload, dict):
+            raise RequestError(400, "request body must be a json object")
+        start = time.perf_counter()
+        result = await self.batchers[path].submit(payload)
+        self.latency[path].append(time.perf_counter() - start)
+        return result
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode('latin1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = line.decode('latin1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                try:
+                    if length > MAX_BODY:
+                        raise RequestError(413, "body over {} bytes".format(MAX_BODY))
+                    body = await reader.readexactly(length) if length else b''
+                    status, response = 200, await self.route(method, path, body)
+                except RequestError as e:
+                    status, response = e.status, {'error': str(e)}
+                except Exception as e:
+                    status, response = 500, {'error': repr(e)}
+                try:
+                    data = json.dumps(response, allow_nan=False).encode()
+                except ValueError as e:
+                    status, data = 500, json.dumps({'error': repr(e)}).encode()
+                writer.write("HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n\r\n".format(
+                                status, REASONS[status], len(data)).encode('latin1') + data)
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close' or status == 413:
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host = '127.0.0.1', port = 8765):
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "local TCO / compare quote service")
+    parser.add_argument('--host', default = '127.0.0.1')
+    parser.add_argument('--port', type = int, default = 8765)
+    parser.add_argument('--window-ms', type = float, default = 2.0, help = "micro-batch coalescing window")
+    parser.add_argument('--max-batch', type = int, default = 4096)
+    args = parser.parse_args()
+
+    service = QuoteService(args.window_ms / 1000.0, args.max_batch)
+    print("serving on http://{}:{}  (POST /tco, POST /compare, GET /stats)".format(args.host, args.port))
+    asyncio.run(service.serve(args.host, args.port))
@@ -0,0 +1,192 @@
+import json
+import operator
+import os
+import struct
+
+import numpy as np
+
+
+MANIFEST = 'manifest.json'
+HEADER_LEN = 256 # reserved .npy header so appended columns can be finalized in place
+
+OPS = {'<': operator.lt,
+       '<=': operator.le,
+       '>': operator.gt,
+       '>=': operator.ge,
+       '==': operator.eq,
+       '!=': operator.ne}
+
+
+def _npy_header(dtype, shape):
+    '''
+    .npy v1.0 header padded to exactly HEADER_LEN bytes
+    '''
+    header = repr({'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)),
+                   'fortran_order': False,
+                   'shape': tuple(shape)})
+    prefix = np.lib.format.magic(1, 0)
+    body_len = HEADER_LEN - len(prefix) - 2
+    if len(header) + 1 > body_len:
+        raise ValueError("shape {} does not fit the reserved header".format(shape))
+    header = header.ljust(body_len - 1) + '\n'
+    return prefix + struct.pack('<H', body_len) + header.encode('latin1')
+
+
+class ResultStore(object):
+    '''
+    directory of .npy columns plus a json manifest
+
+    every column shares its first (row) dimension; sweep cubes keep their
+    extra dimensions, labelled by dims and coords in the manifest. columns
+    are opened lazily as read-only memmaps, so reads never copy
+    '''
+
+    def __init__(self, root):
+        self.root = root
+        path = os.path.join(root, MANIFEST)
+        if os.path.exists(path):
+            with open(path) as f:
+                self.manifest = json.load(f)
+        else:
+            os.makedirs(root, exist_ok=True)
+            self.manifest = {'rows': None, 'columns': {}, 'dims': {}, 'coords': {}}
+        self._open = {}
+        self._appending = {}
+
+    def _path(self, name):
+        return os.path.join(self.root, name + '.npy')
+
+    def _save_manifest(self):
+        with open(os.path.join(self.root, MANIFEST), 'w') as f:
+            json.dump(self.manifest, f, indent=1)
+
+    def _register(self, name, dtype, shape, dims):
+        rows = self.manifest['rows']
+        if rows is not None and shape[0] != rows:
+            raise ValueError("column \"{}\" has {} rows, store has {}".format(name, shape[0], rows))
+        self.manifest['rows'] = shape[0]
+        self.manifest['columns'][name] = {'dtype': np.dtype(dtype).str, 'shape': list(shape)}
+        if dims is not None:
+            self.manifest['dims'][name] = list(dims)
+        self._open.pop(name, None)
+        self._save_manifest()
+
+    def set_coords(self, coords):
+        '''
+        coords, list of (dim name, labels) as returned by sweep
+        '''
+        for dim, labels in coords:
+            labels = np.asarray(labels)
+            self.manifest['coords'][dim] = labels.tolist()
+        self._save_manifest()
+
+    def write(self, name, values, dims = None):
+        values = np.asarray(values)
+        np.save(self._path(name), values)
+        self._register(name, values.dtype, values.shape, dims)
+
+    def create(self, name, shape, dtype = np.float32, dims = None):
+        '''
+        writable memmap column, e.g. sweep(..., out=store.create(...))
+        '''
+        column = np.lib.format.open_memmap(self._path(name), mode='w+', dtype=dtype, shape=tuple(shape))
+        self._register(name, dtype, shape, dims)
+        return column
+
+    def append(self, batch):
+        '''
+        append a dict of equal-length 1d columns, call close() when done
+        '''
+        for name, values in batch.items():
+            values = np.ascontiguousarray(values)
+            if name not in self._appending:
+                f = open(self._path(name), 'wb')
+                f.write(_npy_header(values.dtype, (0,)))
+                self._appending[name] = [f, values.dtype, 0]
+            f, dtype, rows = self._appending[name]
+            f.write(values.astype(dtype, copy=False).tobytes())
+            self._appending[name][2] = rows + len(values)
+
+    def close(self):
+        for name, (f, dtype, rows) in self._appending.items():
+            f.seek(0)
+            f.write(_npy_header(dtype, (rows,)))
+            f.close()
+            self._register(name, dtype, (rows,), None)
+        self._appending = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __contains__(self, name):
+        return name in self.manifest['columns']
+
+    def __getitem__(self, name):
+        if name not in self._open:
+            if name not in self.manifest['columns']:
+                raise KeyError("column \"{}\" not in store {}".format(name, self.root))
+            self._open[name] = np.load(self._path(name), mmap_mode='r')
+        return self._open[name]
+
+    @property
+    def columns(self):
+        return list(self.manifest['columns'])
+
+    def coord_index(self, dim, label, tolerance = 0.0):
+        '''
+        position of label along a sweep dim, the nearest label only if it is
+        within tolerance; KeyError otherwise
+        '''
+        labels = self.manifest['coords'][dim]
+        if label in labels:
+            return labels.index(label)
+        if tolerance > 0:
+            distance = np.abs(np.asarray(labels, dtype=float) - label)
+            nearest = int(np.argmin(distance))
+            if distance[nearest] <= tolerance:
+                return nearest
+        raise KeyError("{} = {!r} is not a label of {}".format(dim, label, self.root))
+
+    def _at(self, name, at, tolerance = 0.0):
+        '''
+        view of a column with sweep dims in at fixed to one label each
+        '''
+        column = self[name]
+        dims = self.manifest['dims'].get(name)
+        if not at or dims is None:
+            return column
+        index = [slice(None)] * column.ndim
+        for dim, label in at.items():
+            if dim in dims:
+                index[dims.index(dim)] = self.coord_index(dim, label, tolerance)
+        return column[tuple(index)]
+
+    def filter(self, predicates, columns = (), at = None, chunk_rows = 1 << 20, tolerance = 0.0):
+        '''
+        rows matching every (column, op, value) predicate
+
+        at fixes sweep dims to a label, e.g. at={'fuel_price': 5.0}, matched
+        exactly unless tolerance allows the nearest label; a predicate on a
+        column with dims left free must hold in every cell
+        only the predicate and requested columns are read, chunk_rows rows at a time
+        returns dict of row ids under 'row' plus the requested columns
+        '''
+        rows = self.manifest['rows'] or 0
+        views = {name: self._at(name, at, tolerance) for name in set(p[0] for p in predicates) | set(columns)}
+        hits = []
+        for start in range(0, rows, chunk_rows):
+            stop = min(start + chunk_rows, rows)
+            mask = np.ones(stop - start, dtype=bool)
+            for name, op, value in predicates:
+                chunk = views[name][start:stop]
+                keep = OPS[op](chunk, value)
+                mask &= keep.reshape(len(keep), -1).all(axis=1)
+            hits.append(np.flatnonzero(mask) + start)
+        row = np.concatenate(hits) if hits else np.zeros(0, dtype=int)
+        result = {'row': row}
+        for name in columns:
+            result[name] = views[name][row]
+        return result
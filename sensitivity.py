@@ -0,0 +1,203 @@
+import numpy as np
+
+from catalog_loader import model_fields
+from vehicle_cost import (get_insurance_cost,
+                          get_maintenance_cost,
+                          get_selling_amt,
+                          main_batch)
+
+
+class Dual(object):
+    '''
+    forward-mode dual number over arrays
+
+    val has the row shape, grad stacks one tangent per input in front of it
+    (grad None is a constant). plain arithmetic, ** and np.minimum /
+    np.maximum work, so the vehicle_cost helpers run on Duals unchanged
+    '''
+
+    __slots__ = ('val', 'grad')
+
+    def __init__(self, val, grad = None):
+        self.val = val
+        self.grad = grad
+
+    @staticmethod
+    def lift(x):
+        return x if isinstance(x, Dual) else Dual(np.asarray(x, dtype=float))
+
+    @staticmethod
+    def _sum(a, b):
+        if a is None:
+            return b
+        if b is None:
+            return a
+        return a + b
+
+    @staticmethod
+    def _scale(g, s):
+        return None if g is None else g * s
+
+    def __add__(self, other):
+        other = Dual.lift(other)
+        return Dual(self.val + other.val, Dual._sum(self.grad, other.grad))
+
+    __radd__ = __add__
+
+    def __neg__(self):
+        return Dual(-self.val, Dual._scale(self.grad, -1.0))
+
+    def __sub__(self, other):
+        return self + (-Dual.lift(other))
+
+    def __rsub__(self, other):
+        return Dual.lift(other) + (-self)
+
+    def __mul__(self, other):
+        other = Dual.lift(other)
+        return Dual(self.val * other.val,
+                    Dual._sum(Dual._scale(self.grad, other.val), Dual._scale(other.grad, self.val)))
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        other = Dual.lift(other)
+        val = self.val / other.val
+        return Dual(val,
+                    Dual._sum(Dual._scale(self.grad, 1.0 / other.val),
+                              Dual._scale(other.grad, -val / other.val)))
+
+    def __rtruediv__(self, other):
+        return Dual.lift(other) / self
+
+    def __pow__(self, other):
+        other = Dual.lift(other)
+        val = self.val ** other.val
+        grad = Dual._scale(self.grad, other.val * self.val ** (other.val - 1))
+        if other.grad is not None:
+            grad = Dual._sum(grad, other.grad * (val * np.log(self.val)))
+        return Dual(val, grad)
+
+    def __rpow__(self, other):
+        return Dual.lift(other) ** self
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        if method != '__call__' or kwargs:
+            return NotImplemented
+        if ufunc in (np.minimum, np.maximum):
+            a, b = (Dual.lift(x) for x in inputs)
+            return where(ufunc(a.val, b.val) == a.val, a, b)
+        binary = {np.add: lambda a, b: a + b,
+                  np.subtract: lambda a, b: a - b,
+                  np.multiply: lambda a, b: a * b,
+                  np.true_divide: lambda a, b: a / b,
+                  np.power: lambda a, b: a ** b}
+        if ufunc in binary:
+            return binary[ufunc](Dual.lift(inputs[0]), inputs[1])
+        return NotImplemented
+
+
+def where(mask, a, b):
+    a, b = Dual.lift(a), Dual.lift(b)
+    val = np.where(mask, a.val, b.val)
+    if a.grad is None and b.grad is None:
+        return Dual(val)
+    ga = a.grad if a.grad is not None else 0.0
+    gb = b.grad if b.grad is not None else 0.0
+    return Dual(val, np.where(mask, ga, gb))
+
+def _fuel_cost(mpg, total_miles, fuel_price_per_gal, miles_per_kwh, elec_cost, elec_pct):
+    '''
+    get_fuel_cost_batch on Duals
+    '''
+    burns_fuel = elec_pct.val < 1.0
+    safe_mpg = where(burns_fuel, mpg, 1.0)
+    fuel_cost = where(burns_fuel, fuel_price_per_gal * (1.0*total_miles / safe_mpg) * (1.0-elec_pct), 0.0)
+
+    elec_cost = total_miles / miles_per_kwh * elec_cost * elec_pct
+
+    return fuel_cost + elec_cost
+
+def _loan_cost(P, r, n):
+    '''
+    compute_loan_cost_array on Duals, at r == 0 the interest is zero with
+    slope P (n+1) / 2 in r
+    '''
+    zero_rate = r.val == 0
+    safe_r = where(zero_rate, 1.0, r)
+    growth = (1+safe_r)**n
+    monthly_payment = P * (safe_r * growth) / (growth - 1)
+    interest = monthly_payment * n - P
+    return where(zero_rate, r * Dual(P.val * (n.val + 1) / 2), interest)
+
+def sensitivity_inputs():
+    '''
+    inputs of main_batch that sensitivities are taken against, in column order
+    '''
+    return [k for k in model_fields(main_batch) if k != 'selling_amt']
+
+def cost_per_mile_sensitivities(**inputs):
+    '''
+    cost_per_mile and d(cost_per_mile)/d(input) for every main_batch input,
+    all vehicles in one forward-mode pass
+
+    inputs are main_batch columns (missing optional inputs take main_batch
+    defaults, selling_amt is always computed)
+    returns cost_per_mile (n,), sensitivities (n, len(names)), names
+
+    at kinks (elec_pct == 1, selling_mileage == vehicle_life_miles) the
+    derivative is the one-sided slope of the branch the row is on
+    '''
+    names = sensitivity_inputs()
+    fields = model_fields(main_batch)
+    values = [np.asarray(inputs.get(k, fields[k]), dtype=float) for k in names]
+    shape = np.broadcast_shapes(*(v.shape for v in values))
+    x = {}
+    for j, (k, v) in enumerate(zip(names, values)):
+        grad = np.zeros((len(names),) + shape)
+        grad[j] = 1.0
+        x[k] = Dual(np.broadcast_to(v, shape).astype(float), grad)
+
+    miles_driven = x['selling_mileage'] - x['starting_mileage']
+    years_own = miles_driven / (1.0 * x['miles_per_year'])
+    purchase_cost_with_tax = x['purchase_cost_no_tax'] * x['tax_rate']
+    selling_amt = get_selling_amt(x['purchase_cost_no_tax'],
+                                  x['depreciation_coef'],
+                                  years_own,
+                                  x['mileage_deprec_importance'],
+                                  x['selling_mileage'],
+                                  x['vehicle_life_miles'])
+    insurance_cost = get_insurance_cost(x['insurance_rate'], years_own)
+    maintenance_cost = get_maintenance_cost(x['maintenance_per_year'],
+                                            x['full_maintenance_age'],
+                                            miles_driven,
+                                            years_own,
+                                            x['vehicle_life_miles'])
+    fuel_cost = _fuel_cost(x['mpg'], miles_driven, x['fuel_price'], x['miles_per_kwh'], x['elec_cost'], x['elec_pct'])
+    interest_cost = _loan_cost(purchase_cost_with_tax, x['apr'] / 12, x['loan_term'])
+
+    total_cost = ( purchase_cost_with_tax
+                 + insurance_cost
+                 + fuel_cost
+                 + maintenance_cost
+                 + interest_cost
+                 - selling_amt)
+    cost_per_mile = total_cost / miles_driven
+    return cost_per_mile.val, np.moveaxis(cost_per_mile.grad, 0, -1), names
+
+def finite_difference_sensitivities(rel_step = 1e-6, **inputs):
+    '''
+    central differences of main_batch, one pair of evaluations per input,
+    to validate cost_per_mile_sensitivities
+    '''
+    names = sensitivity_inputs()
+    fields = model_fields(main_batch)
+    columns = []
+    for k in names:
+        v = np.asarray(inputs.get(k, fields[k]), dtype=float)
+        h = rel_step * np.maximum(np.abs(v), 1.0)
+        up = main_batch(**dict(inputs, **{k: v + h}))['cost_per_mile']
+        down = main_batch(**dict(inputs, **{k: v - h}))['cost_per_mile']
+        columns.append((up - down) / (2 * h))
+    shape = np.broadcast_shapes(*(np.shape(c) for c in columns))
+    return np.stack([np.broadcast_to(c, shape) for c in columns], axis=-1), names
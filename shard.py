@@ -0,0 +1,93 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+# per worker process: name -> (SharedMemory, array view)
+_worker = {}
+
+
+def _share(array):
+    shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+    view = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+    view[...] = array
+    return shm, view
+
+def _attach(specs):
+    '''
+    worker initializer, maps every shared column once per process
+    '''
+    _worker.clear()
+    for key, (shm_name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _worker[key] = (shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+
+def _run_range(model, column_names, scalars, output_names, start, stop):
+    '''
+    evaluate rows [start, stop) and write them into the shared outputs
+    '''
+    inputs = dict(scalars)
+    for k in column_names:
+        inputs[k] = _worker['in:' + k][1][start:stop]
+    results = model(**inputs)
+    if not isinstance(results, dict):
+        results = dict(zip(output_names, results))
+    for k in output_names:
+        _worker['out:' + k][1][start:stop] = results[k]
+    return stop - start
+
+def run_sharded(model,
+                columns,
+                output_names,
+                n_workers = None,
+                chunk_rows = 1 << 16):
+    '''
+    evaluate a batch model (main_batch, get_costs_batch, ...) over row ranges
+    in a process pool
+
+    1d columns and outputs live in multiprocessing.shared_memory; workers map
+    them once and receive only (start, stop) per task, so no row data is
+    pickled. every range writes to its own rows, so the output does not
+    depend on n_workers or scheduling. scalar inputs are shared by all rows
+    output_names picks dict outputs by key, or names tuple outputs in order
+    returns dict of output arrays
+    '''
+    arrays = {k: np.ascontiguousarray(v, dtype=float) for k, v in columns.items() if np.ndim(v) > 0}
+    scalars = {k: v for k, v in columns.items() if np.ndim(v) == 0}
+    lengths = set(len(v) for v in arrays.values())
+    if len(lengths) > 1:
+        raise ValueError("columns have different lengths {}".format(sorted(lengths)))
+    n = lengths.pop() if lengths else 1
+    n_workers = n_workers or os.cpu_count() or 1
+
+    shared = {}
+    try:
+        for k, v in arrays.items():
+            shared['in:' + k] = _share(v)
+        for k in output_names:
+            shared['out:' + k] = _share(np.zeros(n))
+        specs = {key: (shm.name, view.shape, view.dtype.str) for key, (shm, view) in shared.items()}
+
+        ranges = [(start, min(start + chunk_rows, n)) for start in range(0, n, chunk_rows)]
+        task = (model, list(arrays), scalars, list(output_names))
+        if n_workers == 1:
+            _attach(specs)
+            for start, stop in ranges:
+                _run_range(*task, start, stop)
+        else:
+            with ProcessPoolExecutor(n_workers, initializer=_attach, initargs=(specs,)) as pool:
+                futures = [pool.submit(_run_range, *task, start, stop) for start, stop in ranges]
+                for future in futures:
+                    future.result()
+
+        return {k: shared['out:' + k][1].copy() for k in output_names}
+    finally:
+        # views must be dropped before their buffers can be closed
+        _worker.clear()
+        segments = [shm for shm, _ in shared.values()]
+        shared.clear()
+        for shm in segments:
+            shm.close()
+            shm.unlink()
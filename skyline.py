@@ -0,0 +1,66 @@
+import bisect
+
+import numpy as np
+
+
+def _sorted_order(initial_cost, usage_cost):
+    initial_cost = np.asarray(initial_cost, dtype=float)
+    usage_cost = np.asarray(usage_cost, dtype=float)
+    return np.lexsort((usage_cost, initial_cost)), initial_cost, usage_cost
+
+def pareto_front(initial_cost, usage_cost):
+    '''
+    indices of the vehicles no other vehicle beats on both initial_cost and
+    usage_cost (lower is better), in increasing initial_cost
+
+    one sort then a running minimum of usage_cost, O(n log n). identical
+    vehicles do not dominate each other, so duplicates on the front all stay
+    '''
+    order, initial_cost, usage_cost = _sorted_order(initial_cost, usage_cost)
+    s_initial, s_usage = initial_cost[order], usage_cost[order]
+    if len(order) == 0:
+        return order
+
+    # first position of every run of equal initial_cost
+    new_group = np.empty(len(order), dtype=bool)
+    new_group[0] = True
+    new_group[1:] = s_initial[1:] != s_initial[:-1]
+    group_start = np.maximum.accumulate(np.where(new_group, np.arange(len(order)), 0))
+
+    # best usage among strictly cheaper initial costs, best usage of the run
+    running_min = np.minimum.accumulate(s_usage)
+    cheaper_min = np.where(group_start > 0, running_min[group_start - 1], np.inf)
+    on_front = (s_usage < cheaper_min) & (s_usage == s_usage[group_start])
+    return order[on_front]
+
+def skyline_layers(initial_cost, usage_cost, k = None):
+    '''
+    skyline layer of every vehicle: 0 is the pareto front, 1 the front once
+    layer 0 is removed, and so on; vehicles below the first k layers get -1
+
+    vehicles are visited in increasing initial_cost, so a vehicle is
+    dominated by a layer exactly when that layer's lowest usage_cost so far
+    is not above its own. those minima stay sorted across layers and each
+    vehicle is placed with one bisection, O(n log n) overall (O(n log k)
+    with k). np.flatnonzero(layers == j) lists layer j
+    '''
+    order, initial_cost, usage_cost = _sorted_order(initial_cost, usage_cost)
+    layers = np.full(len(order), -1, dtype=np.intp)
+    # per layer: lowest usage_cost so far and the initial_cost it came with
+    tails = []
+    last = []
+    for i, c, u in zip(order.tolist(), initial_cost[order].tolist(), usage_cost[order].tolist()):
+        layer = bisect.bisect_right(tails, u)
+        if layer > 0 and tails[layer - 1] == u and last[layer - 1] == c:
+            # an identical vehicle does not dominate its twin
+            layer -= 1
+        if k is not None and layer >= k:
+            continue
+        if layer == len(tails):
+            tails.append(u)
+            last.append(c)
+        else:
+            tails[layer] = u
+            last[layer] = c
+        layers[i] = layer
+    return layers
@@ -1,3 +1,6 @@
+import numpy as np
+
+
 def get_charge_time(speed, efficiency, charge_rate, T):
     R = speed * efficiency / charge_rate # no units
     charge_time = T * R / (1+R) # hours
@@ -18,6 +21,104 @@ def time_traveled(s, e, r, c, d):
     T = tc + td
     print("{:3d}  {:3.0f}  {:4.1f}  {:4.1f}  {:4.1f}  {:3.0f}  {:3.0f}".format(s, 1000*e, td, tc, T, E, max(0, E-c)))
 
+def miles_per_day_batch(speed, efficiency, charge_rate, T):
+    '''
+    miles_per_day over broadcast arrays without printing
+    returns dict of arrays: drive_time, charge_time, miles, kwh
+    '''
+    charge_time = get_charge_time(speed, efficiency, charge_rate, T)
+    mpd = speed * (T - charge_time)
+    return {'drive_time': T - charge_time,
+            'charge_time': charge_time,
+            'miles': mpd,
+            'kwh': mpd * efficiency}
+
+def time_traveled_batch(s, e, r, c, d):
+    '''
+    time_traveled over broadcast arrays without printing
+    returns dict of arrays: drive_time, charge_time, total_time, kwh, supplement
+    '''
+    E = d * e
+    supplement = np.maximum(0, E - c)
+    tc = supplement / r
+    td = d / s
+    return {'drive_time': td,
+            'charge_time': tc,
+            'total_time': tc + td,
+            'kwh': E,
+            'supplement': supplement}
+
+def _pchip_slopes(x, y):
+    '''
+    fritsch-carlson derivatives, the cubic hermite through them keeps the
+    monotonicity of the data between every pair of points
+    '''
+    h = np.diff(x)
+    delta = np.diff(y) / h
+    d = np.zeros_like(y)
+    if len(x) == 2:
+        d[:] = delta[0]
+        return d
+
+    w1 = 2*h[1:] + h[:-1]
+    w2 = h[1:] + 2*h[:-1]
+    same_sign = delta[:-1] * delta[1:] > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d[1:-1] = np.where(same_sign, (w1 + w2) / (w1 / delta[:-1] + w2 / delta[1:]), 0.0)
+
+    for end, h0, h1, d0, d1 in ((0, h[0], h[1], delta[0], delta[1]),
+                                (-1, h[-1], h[-2], delta[-1], delta[-2])):
+        slope = ((2*h0 + h1) * d0 - h0 * d1) / (h0 + h1)
+        if np.sign(slope) != np.sign(d0):
+            slope = 0.0
+        elif np.sign(d0) != np.sign(d1) and abs(slope) > abs(3 * d0):
+            slope = 3 * d0
+        d[end] = slope
+    return d
+
+def efficiency_curve(speed, efficiency, kind = 'linear'):
+    '''
+    efficiency (kWh/mi) at any speed from measured (speed, efficiency) points
+    kind is 'linear' (piecewise linear) or 'pchip' (monotone cubic spline)
+    returns f(speeds) -> efficiencies, held at the end values outside the data
+    '''
+    order = np.argsort(speed)
+    x = np.asarray(speed, dtype=float)[order]
+    y = np.asarray(efficiency, dtype=float)[order]
+    if kind == 'linear':
+        return lambda s: np.interp(s, x, y)
+    if kind != 'pchip':
+        raise ValueError("unknown efficiency curve kind \"{}\"".format(kind))
+
+    d = _pchip_slopes(x, y)
+    def curve(s):
+        s = np.clip(np.asarray(s, dtype=float), x[0], x[-1])
+        i = np.clip(np.searchsorted(x, s, side='right') - 1, 0, len(x) - 2)
+        h = x[i+1] - x[i]
+        t = (s - x[i]) / h
+        t2 = t * t
+        t3 = t2 * t
+        return ( (2*t3 - 3*t2 + 1) * y[i]
+               + (t3 - 2*t2 + t) * h * d[i]
+               + (-2*t3 + 3*t2) * y[i+1]
+               + (t3 - t2) * h * d[i+1])
+    return curve
+
+def charge_grid(speed, charge_rate, T, curve, dist_travel = 372, start_kwh = 65):
+    '''
+    miles_per_day and time_traveled for every speed x charge_rate x T in one
+    array pass, efficiency taken from curve (see efficiency_curve)
+    returns (per_day, trip), dicts of arrays of shape
+    (len(speed), len(charge_rate), len(T)) and (len(speed), len(charge_rate), 1)
+    '''
+    speed = np.asarray(speed, dtype=float).reshape(-1, 1, 1)
+    charge_rate = np.asarray(charge_rate, dtype=float).reshape(1, -1, 1)
+    T = np.asarray(T, dtype=float).reshape(1, 1, -1)
+    efficiency = curve(speed)
+    per_day = miles_per_day_batch(speed, efficiency, charge_rate, T)
+    trip = time_traveled_batch(speed, efficiency, charge_rate, start_kwh, dist_travel)
+    return per_day, trip
+
 
 def main(charge_rate, speed, efficiency, T, dist_travel=372, start_kwh=65):
     print("Travel for {} hours".format(T))
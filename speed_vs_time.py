@@ -1,4 +1,4 @@
-import matplotlib.pyplot as plt
+import os
 
 def compute_energy_per_mile(speeds, powers):
     energy_per_mile = [p*1000/s for s,p in zip(speeds, powers)]
@@ -57,7 +57,10 @@ def print_results(speed,
         prev_trip_cost = trip_cost
     print()
 
-def main():
+def main(plot_dir = None):
+    '''
+    plot_dir, write the plot there (headless) instead of showing it
+    '''
     charge_speed = 125 #kW
     battery_capacity = 82 #kWh
     stop_fixed_cost = 3.0/60 # add'l hours per stop
@@ -90,13 +93,59 @@ def main():
                   time_traveled,
                   trip_dist)
 
-    cost = [c*trip_dist for c in cost_per_dist]
+    if plot_dir is not None:
+        return export_plots([{'name': 'speed_vs_cost',
+                              'speed': speed,
+                              'power_at_speed': power_at_speed,
+                              'energy_cost': energy_cost,
+                              'trip_dist': trip_dist}], plot_dir)
+
+    import matplotlib.pyplot as plt
+    cost = trip_cost(cost_per_dist, trip_dist)
     plt.plot(speed, cost)
-    plt.xlabel("Real speed (mph)")
-    plt.ylabel("$ / {} mi".format(trip_dist))
-    plt.xlim([0, max(speed)*1.10])
-    plt.ylim([min(cost)*.9, max(cost)*1.10])
+    format_cost_axes(plt.gca(), speed, cost, trip_dist)
     plt.show()
 
+def trip_cost(cost_per_dist, trip_dist):
+    return [c*trip_dist for c in cost_per_dist]
+
+def format_cost_axes(ax, speed, cost, trip_dist):
+    ax.set_xlabel("Real speed (mph)")
+    ax.set_ylabel("$ / {} mi".format(trip_dist))
+    ax.set_xlim([0, max(speed)*1.10])
+    ax.set_ylim([min(cost)*.9, max(cost)*1.10])
+
+def export_plots(scenarios, out_dir, formats = ('png',)):
+    '''
+    headless render of many cost curves to files, no pyplot or display needed
+
+    scenarios, list of dicts with name, speed, power_at_speed, energy_cost, trip_dist
+    one Agg figure, axes and line are reused, only their data changes per plot
+    returns the written paths
+    '''
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    line, = ax.plot([], [])
+
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for scenario in scenarios:
+        energy_per_mile = compute_energy_per_mile(scenario['speed'], scenario['power_at_speed'])
+        cost_per_dist = compute_cost(scenario['energy_cost'], energy_per_mile)
+        cost = trip_cost(cost_per_dist, scenario['trip_dist'])
+
+        line.set_data(scenario['speed'], cost)
+        format_cost_axes(ax, scenario['speed'], cost, scenario['trip_dist'])
+        ax.set_title(scenario['name'])
+        for fmt in formats:
+            path = os.path.join(out_dir, "{}.{}".format(scenario['name'], fmt))
+            fig.savefig(path, format=fmt)
+            paths.append(path)
+    return paths
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,78 @@
+import numpy as np
+
+from vehicle_cost import main_batch
+
+
+def sweep_shape(vehicles, axes):
+    '''
+    vehicles, dict of main_batch column arrays (scalars are shared by all vehicles)
+    axes, ordered dict of main_batch parameter -> 1d values to sweep
+    returns the (n_vehicles, len(axis0), len(axis1), ...) cube shape
+    '''
+    lengths = [np.size(v) for k, v in vehicles.items() if k not in axes and np.ndim(v) > 0]
+    n_vehicles = max(lengths) if lengths else 1
+    return (n_vehicles,) + tuple(len(v) for v in axes.values())
+
+def _cube_inputs(vehicles, axes, ndim):
+    '''
+    reshape every input so it broadcasts along its own cube dimension
+    '''
+    inputs = {}
+    for k, v in vehicles.items():
+        if k in axes:
+            continue
+        v = np.asarray(v, dtype=float)
+        inputs[k] = v.reshape((-1,) + (1,) * (ndim - 1)) if v.ndim > 0 else v
+    for dim, (k, v) in enumerate(axes.items(), start=1):
+        shape = [1] * ndim
+        shape[dim] = -1
+        inputs[k] = np.asarray(v, dtype=float).reshape(shape)
+    return inputs
+
+def sweep(vehicles,
+          axes,
+          output = 'cost_per_mile',
+          names = None,
+          out = None,
+          dtype = np.float32,
+          max_chunk_cells = 1 << 19):
+    '''
+    evaluate main_batch over the cartesian product of vehicles and the named axes
+
+    axes overrides any vehicle column of the same name
+    the cube is filled in slabs along its largest dimension so temporaries stay
+    bounded by max_chunk_cells; out may be a preallocated array or np.memmap
+    returns cube, coords where coords is a list of (dim name, labels)
+    '''
+    shape = sweep_shape(vehicles, axes)
+    ndim = len(shape)
+    if out is None:
+        out = np.empty(shape, dtype=dtype)
+    elif out.shape != shape:
+        raise ValueError("out has shape {}, sweep needs {}".format(out.shape, shape))
+
+    inputs = _cube_inputs(vehicles, axes, ndim)
+
+    chunk_dim = int(np.argmax(shape))
+    cells_per_slice = int(np.prod(shape)) // max(1, shape[chunk_dim])
+    step = max(1, max_chunk_cells // max(1, cells_per_slice))
+
+    for start in range(0, shape[chunk_dim], step):
+        stop = min(start + step, shape[chunk_dim])
+        index = [slice(None)] * ndim
+        index[chunk_dim] = slice(start, stop)
+        index = tuple(index)
+        chunk_inputs = {k: (v[index] if v.ndim == ndim and v.shape[chunk_dim] > 1 else v)
+                        for k, v in inputs.items()}
+        out[index] = main_batch(**chunk_inputs)[output]
+
+    if names is None:
+        names = np.arange(shape[0])
+    coords = [('vehicle', np.asarray(names))] + [(k, np.asarray(v)) for k, v in axes.items()]
+    return out, coords
+
+def rank_vehicles(cube):
+    '''
+    rank of every vehicle (0 is cheapest) in each cell of a sweep cube
+    '''
+    return np.argsort(np.argsort(cube, axis=0), axis=0)
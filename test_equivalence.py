@@ -0,0 +1,228 @@
+'''
+batch, closed form and derivative kernels against the scalar paths they replace
+
+python -m pytest -q
+'''
+import json
+
+import numpy as np
+import pytest
+
+import vehicle_cost
+from cash_flow import compare_cash_flows, monthly_cash_flows, period_totals
+from catalog_loader import CatalogError, iter_batches
+from intermediate_vehicle import VehicleNotFoundError, accrued_at, accrued_cost, break_even_years, cost_compare_batch, cost_compare_horizons, select_car
+from leaderboard import Leaderboard
+from monte_carlo import histogram_percentiles
+from quote_service import RequestError, evaluate_tco
+from sensitivity import cost_per_mile_sensitivities, finite_difference_sensitivities
+from skyline import pareto_front, skyline_layers
+
+
+def _vehicles(n, seed = 0):
+    '''
+    main_batch columns covering cash / financed, gas / hybrid / electric and
+    selling before and after the end of vehicle life
+    '''
+    rng = np.random.default_rng(seed)
+    return dict(purchase_cost_no_tax = rng.uniform(5000, 60000, n),
+                tax_rate = rng.choice([1.0, 1.07], n),
+                depreciation_coef = rng.uniform(0.8, 0.95, n),
+                miles_per_year = rng.uniform(5000, 20000, n),
+                insurance_rate = rng.uniform(400, 700, n),
+                starting_mileage = rng.choice([0.0, 25000.0, 60000.0], n),
+                mpg = rng.uniform(18, 55, n),
+                fuel_price = rng.uniform(2.5, 5.0, n),
+                selling_mileage = rng.uniform(100000, 300000, n),
+                maintenance_per_year = rng.uniform(300, 1500, n),
+                apr = rng.choice([0.0, 0.03, 0.06], n),
+                loan_term = rng.choice([36, 60, 72], n),
+                elec_pct = rng.choice([0.0, 0.4, 1.0], n))
+
+def _pairs(n, seed = 0):
+    '''
+    (ica, uca, icb, ucb) for n pairs of get_costs outputs
+    '''
+    rng = np.random.default_rng(seed)
+    return rng.uniform(20000, 70000, n), rng.uniform(1000, 6000, n), rng.uniform(20000, 70000, n), rng.uniform(1000, 6000, n)
+
+def _row(columns, i):
+    return {k: v[i] for k, v in columns.items()}
+
+
+def test_main_batch_matches_evaluate():
+    columns = _vehicles(200)
+    # given selling amounts for some rows, nan asks main_batch to compute it
+    selling_amt = np.where(np.arange(200) % 3 == 0, 9000.0, np.nan)
+    results = vehicle_cost.main_batch(selling_amt = selling_amt, **columns)
+    for i in range(200):
+        row = _row(columns, i)
+        if i % 3 == 0:
+            row['selling_amt'] = 9000.0
+        expected = vehicle_cost.evaluate(str(i), **row)
+        for k, v in results.items():
+            np.testing.assert_allclose(v[i], getattr(expected, k), rtol = 1e-9, err_msg = k)
+
+def test_sensitivities_match_finite_differences():
+    columns = _vehicles(200)
+    # elec_pct == 1 is a kink that central differences straddle
+    columns['elec_pct'] = np.where(columns['elec_pct'] == 1.0, 0.9, columns['elec_pct'])
+    cost_per_mile, sensitivities, names = cost_per_mile_sensitivities(**columns)
+    finite_difference, fd_names = finite_difference_sensitivities(rel_step = 1e-4, **columns)
+    assert names == fd_names
+    np.testing.assert_allclose(cost_per_mile, vehicle_cost.main_batch(**columns)['cost_per_mile'], rtol = 1e-12)
+    # differences lose digits on derivatives far below their column's scale
+    scale = np.maximum(np.abs(sensitivities), 1e-3 * np.abs(sensitivities).max(axis=0))
+    assert np.all(np.abs(sensitivities - finite_difference) <= 1e-4 * scale)
+
+def test_horizons_match_yearly_loop():
+    ica, uca, icb, ucb = _pairs(100)
+    loan_term = np.random.default_rng(1).choice([12, 36, 72, 120], 100)
+    for opp_cost_rate in (1.0, 1.04):
+        horizons = cost_compare_horizons(ica, uca, icb, ucb, loan_term, opp_cost_rate, max_years = 20)
+        for num_years in (1, 5, 6, 11, 20):
+            loop = cost_compare_batch(ica, uca, icb, ucb, loan_term, num_years, opp_cost_rate)
+            for k, v in loop.items():
+                np.testing.assert_allclose(horizons[k][:, num_years - 1], v, rtol = 1e-9, atol = 1e-6, err_msg = k)
+            np.testing.assert_allclose(accrued_cost(ica, uca, 72, num_years, opp_cost_rate),
+                                       cost_compare_horizons(ica, uca, icb, ucb, 72, opp_cost_rate, 20)['a_accrued'][:, num_years - 1],
+                                       rtol = 1e-12)
+
+def test_monthly_cash_flows_match_yearly_model():
+    ica, uca, icb, ucb = _pairs(100)
+    loan_term = np.random.default_rng(1).choice([12, 36, 72], 100)
+    flows_a = monthly_cash_flows(ica, uca, loan_term, 240)
+    flows_b = monthly_cash_flows(icb, ucb, loan_term, 240)
+
+    years = np.arange(20)
+    yearly_cost_a = np.where(years * 12 < loan_term[:, None], (ica * 12.0 / loan_term)[:, None], 0.0) + uca[:, None]
+    np.testing.assert_allclose(period_totals(flows_a), yearly_cost_a, rtol = 1e-12)
+
+    monthly = compare_cash_flows(flows_a, flows_b, 1.04, compound_every = 12)
+    for num_years in (1, 3, 7, 20):
+        loop = cost_compare_batch(ica, uca, icb, ucb, loan_term, num_years, 1.04)
+        for k, v in loop.items():
+            np.testing.assert_allclose(monthly[k][:, num_years - 1], v, rtol = 1e-9, atol = 1e-6, err_msg = k)
+
+def test_histogram_percentiles_within_one_bin():
+    rng = np.random.default_rng(0)
+    samples = np.stack([rng.normal(0.4, 0.05, 20000), rng.exponential(0.1, 20000)], axis=1)
+    lo, hi, bins = np.array([0.3, 0.0]), np.array([0.5, 0.4]), 1000
+    index = np.clip(np.floor((samples - lo) / ((hi - lo) / bins)), -1, bins).astype(int) + 1
+    counts = np.stack([np.bincount(index[:, v], minlength=bins + 2) for v in range(2)])
+    percentiles = histogram_percentiles(counts, lo, hi, samples.min(axis=0), samples.max(axis=0), (5, 50, 95, 99.9))
+    exact = np.percentile(samples, (5, 50, 95, 99.9), axis=0)
+    # 99.9 of the normal falls in the overflow bin, bounded by the sample max
+    inside = exact < hi
+    assert np.all(np.abs(percentiles - exact)[inside] <= np.broadcast_to((hi - lo) / bins, exact.shape)[inside])
+    assert np.all((percentiles >= hi) == ~inside)
+
+def test_leaderboard_ranks_every_name():
+    columns = _vehicles(500)
+    results = vehicle_cost.main_batch(**columns)
+    # rounded costs force ties, which rank by push order
+    results['cost_per_mile'] = np.round(results['cost_per_mile'], 2)
+    is_new = np.arange(500) % 4 == 0
+    names = [str(i) for i in range(500)]
+    board = Leaderboard(k = 5)
+    board.push_batch(names[:300], {k: v[:300] for k, v in results.items()}, is_new[:300])
+    for i in range(300, 500):
+        board.push(names[i], *(results[k][i] for k in ('cost_per_mile', 'cost_per_year', 'years_own', 'selling_amt', 'cost_at_loan_payoff')), is_new = is_new[i])
+
+    for segment, mask in (('all', np.ones(500, dtype=bool)), ('new', is_new), ('used', ~is_new)):
+        order = [i for i in np.argsort(results['cost_per_mile'], kind='stable') if mask[i]]
+        for rank, i in enumerate(order, start = 1):
+            assert board.rank(names[i], segment) == rank
+        assert [entry.name for entry in board.top(segment)] == [names[i] for i in order[:5]]
+
+def test_catalog_errors_name_the_row_line(tmp_path):
+    header = 'name,purchase_cost_no_tax,tax_rate,depreciation_coef,miles_per_year,insurance_rate,starting_mileage,mpg,fuel_price,selling_mileage,maintenance_per_year\n'
+    good = 'a,20000,1,0.9,10000,500,0,30,3,150000,500\n'
+    bad = 'b,20000,1,0.9,10000,500,0,x,3,150000,500\n'
+    # blank lines and a quoted name spanning two lines shift the rows below them
+    for text, line in ((header + good + '\n' + bad, 4),
+                       (header + '"a\nb"' + good[1:] + bad, 4),
+                       (header + good + '\n\n' + good + bad, 6)):
+        catalog = tmp_path / 'catalog.csv'
+        catalog.write_text(text)
+        for chunk_rows in (1, 2, 100):
+            with pytest.raises(CatalogError, match = r'catalog\.csv:{}: field "mpg"'.format(line)):
+                list(iter_batches(str(catalog), chunk_rows = chunk_rows))
+
+    catalog = tmp_path / 'catalog.jsonl'
+    catalog.write_text('{"purchase_cost_no_tax": 1}\n\n{"purchase_cost_no_tax": "x"}\n')
+    with pytest.raises(CatalogError, match = r'catalog\.jsonl:3: field "purchase_cost_no_tax"'):
+        list(iter_batches(str(catalog), model = lambda purchase_cost_no_tax: None))
+
+def test_vehicle_not_found_suggests_lazily():
+    searched = []
+    error = VehicleNotFoundError('civik', lambda: searched.append(1) or ['civic'])
+    assert not searched
+    assert str(error) == 'name "civik" not found, did you mean "civic"?'
+    assert error.suggestions == ['civic'] and searched == [1]
+
+    with pytest.raises(KeyError, match = 'did you mean "corolla"'):
+        select_car({'civic': (1.0, 2.0), 'corolla': (3.0, 4.0)}, 'corola')
+
+def test_quotes_are_strict_json():
+    columns = _vehicles(3)
+    payloads = [{k: float(v[i]) for k, v in columns.items()} for i in range(3)]
+    payloads[1].update(mpg = 0.0, elec_pct = 0.0)
+    with np.errstate(divide = 'ignore'):
+        quotes = evaluate_tco(payloads)
+    assert quotes[1]['cost_per_mile'] is None and quotes[0]['cost_per_mile'] > 0
+    json.dumps(quotes, allow_nan = False)
+
+    payloads[1]['mpg'] = float('inf')
+    with pytest.raises(RequestError, match = 'finite'):
+        evaluate_tco(payloads)
+
+def _peel_layers(initial_cost, usage_cost):
+    '''
+    skyline layers by repeatedly removing every vehicle no remaining vehicle
+    dominates, O(n**2) per layer
+    '''
+    layers = np.full(len(initial_cost), -1)
+    remaining = list(range(len(initial_cost)))
+    layer = 0
+    while remaining:
+        front = [i for i in remaining
+                 if not any(initial_cost[j] <= initial_cost[i] and usage_cost[j] <= usage_cost[i]
+                            and (initial_cost[j], usage_cost[j]) != (initial_cost[i], usage_cost[i]) for j in remaining)]
+        layers[front] = layer
+        remaining = [i for i in remaining if layers[i] < 0]
+        layer += 1
+    return layers
+
+def test_skyline_matches_peeling():
+    rng = np.random.default_rng(0)
+    for n, values in ((1, 3), (40, 4), (200, 10), (300, 1000)):
+        # small integer ranges force ties on one axis and exact duplicates
+        initial_cost, usage_cost = rng.integers(0, values, n), rng.integers(0, values, n)
+        expected = _peel_layers(initial_cost, usage_cost)
+        np.testing.assert_array_equal(skyline_layers(initial_cost, usage_cost), expected)
+        np.testing.assert_array_equal(skyline_layers(initial_cost, usage_cost, k = 2), np.where(expected < 2, expected, -1))
+        assert sorted(pareto_front(initial_cost, usage_cost)) == list(np.flatnonzero(expected == 0))
+
+def test_break_even_matches_first_yearly_sign_change():
+    rng = np.random.default_rng(2)
+    # A cheaper to buy but costlier to run than B, so most pairs cross
+    ica, uca, icb, ucb = rng.uniform(15000, 40000, 300), rng.uniform(3000, 7000, 300), rng.uniform(30000, 60000, 300), rng.uniform(500, 3000, 300)
+    loan_term = rng.choice([12, 36, 72], 300)
+    opp_cost_rate = rng.choice([1.0, 1.04], 300)
+    years = break_even_years(ica, uca, icb, ucb, loan_term, opp_cost_rate, max_years = 30)
+
+    sign = np.stack([np.sign(cost_compare_batch(ica, uca, icb, ucb, loan_term, num_years, opp_cost_rate)['net_gain_a'])
+                     for num_years in range(1, 31)], axis = 1)
+    changed = (sign != sign[:, :1]) & (sign[:, :1] != 0)
+    assert changed.any(axis = 1).sum() > 100 and (~changed.any(axis = 1)).sum() > 10
+    for i in range(300):
+        if not changed[i].any():
+            assert years[i] == np.inf
+            continue
+        # sign[:, k] is year k + 1, a change there puts the root in [k, k + 1]
+        k = changed[i].argmax()
+        assert k <= years[i] <= k + 1
+        a = accrued_at(ica[i], uca[i], loan_term[i] / 12, opp_cost_rate[i], years[i])
+        b = accrued_at(icb[i], ucb[i], loan_term[i] / 12, opp_cost_rate[i], years[i])
+        assert abs(a - b) <= 1e-6 * a
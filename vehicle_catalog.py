@@ -0,0 +1,153 @@
+import bisect
+import collections
+import difflib
+
+import numpy as np
+
+from catalog_loader import REQUIRED, iter_batches, model_fields
+from intermediate_vehicle import VehicleNotFoundError, get_costs_batch
+from skyline import skyline_layers
+
+
+DERIVED = ('initial_cost', 'usage_cost')
+
+
+class VehicleCatalog(object):
+    '''
+    named vehicles, their get_costs specs and derived initial_cost /
+    usage_cost held in contiguous column arrays with a name -> row index
+
+    catalog[name] returns (initial_cost, usage_cost) like the all_cars dict,
+    so select_car and cost_compare accept either. a miss raises
+    VehicleNotFoundError (a KeyError) whose closest names are only searched
+    for when the error is shown
+    '''
+
+    def __init__(self, capacity = 1024):
+        self.fields = model_fields(get_costs_batch)
+        self.names = []
+        self.index = {}
+        self._columns = {k: np.empty(max(1, capacity)) for k in list(self.fields) + list(DERIVED)}
+        self._sorted = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __getitem__(self, name):
+        row = self.row(name)
+        return float(self._columns['initial_cost'][row]), float(self._columns['usage_cost'][row])
+
+    def _reserve(self, size):
+        capacity = len(self._columns['initial_cost'])
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        for k, column in self._columns.items():
+            grown = np.empty(capacity)
+            grown[:len(self)] = column[:len(self)]
+            self._columns[k] = grown
+
+    def add_many(self, names, **columns):
+        '''
+        bulk insert, columns are get_costs keyword arrays (or scalars shared
+        by every row), missing optional specs take the get_costs defaults
+        returns the rows of the new vehicles
+        '''
+        names = list(names)
+        n = len(names)
+        unknown = set(columns) - set(self.fields)
+        if unknown:
+            raise ValueError("unknown vehicle specs {}".format(sorted(unknown)))
+        if len(set(names)) != n or not self.index.keys().isdisjoint(names):
+            counts = collections.Counter(names)
+            duplicates = sorted(k for k, c in counts.items() if c > 1 or k in self.index)
+            raise ValueError("vehicles already in catalog {}".format(duplicates[:10]))
+
+        specs = {}
+        for k, default in self.fields.items():
+            if k not in columns:
+                if default is REQUIRED:
+                    raise ValueError("missing vehicle spec \"{}\"".format(k))
+                columns[k] = default
+            specs[k] = np.broadcast_to(np.asarray(columns[k], dtype=float), (n,))
+        initial_cost, usage_cost = get_costs_batch(**specs)
+        specs['initial_cost'], specs['usage_cost'] = initial_cost, usage_cost
+
+        start = len(self)
+        self._reserve(start + n)
+        for k, column in self._columns.items():
+            column[start:start + n] = specs[k]
+        self.names.extend(names)
+        self.index.update(zip(names, range(start, start + n)))
+        self._sorted = None
+        return np.arange(start, start + n)
+
+    def add(self, name, **spec):
+        '''
+        insert one vehicle, same keywords as get_costs
+        '''
+        return int(self.add_many([name], **spec)[0])
+
+    def row(self, name):
+        try:
+            return self.index[name]
+        except KeyError:
+            raise VehicleNotFoundError(name, lambda: self.fuzzy(name))
+
+    def rows(self, names):
+        return np.fromiter((self.row(name) for name in names), dtype=np.intp)
+
+    def column(self, k):
+        '''
+        read-only view of one spec or derived column over every vehicle
+        '''
+        view = self._columns[k][:len(self)]
+        view.flags.writeable = False
+        return view
+
+    def spec(self, name):
+        row = self.row(name)
+        return {k: float(column[row]) for k, column in self._columns.items()}
+
+    def prefix(self, prefix):
+        '''
+        names starting with prefix, in sorted order
+        '''
+        if self._sorted is None:
+            self._sorted = sorted(self.names)
+        start = bisect.bisect_left(self._sorted, prefix)
+        stop = start
+        while stop < len(self._sorted) and self._sorted[stop].startswith(prefix):
+            stop += 1
+        return self._sorted[start:stop]
+
+    def fuzzy(self, name, n = 3, cutoff = 0.6):
+        '''
+        closest names by difflib similarity
+        '''
+        return difflib.get_close_matches(name, self.names, n, cutoff)
+
+    def frontier(self, k = 1):
+        '''
+        names on the first k skyline layers of (initial_cost, usage_cost),
+        the only vehicles worth passing to pairwise comparisons
+        '''
+        layers = skyline_layers(self.column('initial_cost'), self.column('usage_cost'), k)
+        return [self.names[i] for i in np.flatnonzero(layers >= 0)]
+
+
+def load_catalog(path, chunk_rows = 65536, catalog = None):
+    '''
+    stream a .csv / .jsonl catalog of get_costs specs into a VehicleCatalog
+    '''
+    catalog = catalog if catalog is not None else VehicleCatalog()
+    for names, _, columns in iter_batches(path, get_costs_batch, chunk_rows):
+        catalog.add_many(names, **columns)
+    return catalog
@@ -1,3 +1,10 @@
+import numpy as np
+
+import instrument
+from loan import compute_loan_cost, compute_loan_cost_array
+
+
+@instrument.timed('vehicle_cost.depreciation')
 def get_selling_amt(purchase_cost,
                     depreciation_coef,
                     years_own,
@@ -5,7 +12,7 @@ def get_selling_amt(purchase_cost,
                     selling_mileage,
                     vehicle_life_miles):
     deprec_age = depreciation_coef**years_own
-    deprec_mileage = 1 - min(1.0, selling_mileage*1.0 / vehicle_life_miles)
+    deprec_mileage = 1 - np.minimum(1.0, selling_mileage*1.0 / vehicle_life_miles)
 
 
     deprec_factor = deprec_age * (1-mileage_deprec_importance) + deprec_mileage * mileage_deprec_importance
@@ -14,6 +21,7 @@ def get_selling_amt(purchase_cost,
     return sell_price
 
 
+@instrument.timed('vehicle_cost.fuel')
 def get_fuel_cost(mpg, total_miles, fuel_price_per_gal, miles_per_kwh, elec_cost, elec_pct):
     if elec_pct < 1.0:
         gallons_used = (1.0*total_miles) / mpg
@@ -25,39 +33,120 @@ def get_fuel_cost(mpg, total_miles, fuel_price_per_gal, miles_per_kwh, elec_cost
 
     return fuel_cost + elec_cost
 
-def compute_loan_cost(P, r, n):
+def get_fuel_cost_batch(mpg, total_miles, fuel_price_per_gal, miles_per_kwh, elec_cost, elec_pct):
     '''
-    P, principal
-    r, monthly APR
-    n, total number of months
+    array version of get_fuel_cost, rows with elec_pct >= 1 burn no fuel
+    '''
+    mpg, total_miles, elec_pct = np.broadcast_arrays(np.asarray(mpg, dtype=float),
+                                                     np.asarray(total_miles, dtype=float),
+                                                     np.asarray(elec_pct, dtype=float))
+    burns_fuel = elec_pct < 1.0
+    gallons_used = np.divide(1.0*total_miles, mpg, out=np.zeros_like(total_miles), where=burns_fuel)
+    fuel_cost = np.where(burns_fuel, fuel_price_per_gal * gallons_used * (1.0-elec_pct), 0.0)
+
+    elec_cost = total_miles / miles_per_kwh * elec_cost * elec_pct
+
+    return fuel_cost + elec_cost
+
+@instrument.timed('vehicle_cost.insurance')
+def get_insurance_cost(insurance_rate, years_own):
+    return insurance_rate * 2 * years_own
+
+@instrument.timed('vehicle_cost.maintenance')
+def get_maintenance_cost(maintenance_per_year, full_maintenance_age, miles_driven, years_own, vehicle_life_miles):
+    '''
+    average of a time based and a mileage based estimate
+    '''
+    pct_mileage_maintenance_done = np.minimum(1.0, miles_driven / vehicle_life_miles)
+    mileage_maintenance_cost = full_maintenance_age * maintenance_per_year * pct_mileage_maintenance_done
+
+    time_maintenance_cost = maintenance_per_year * years_own
+    return (time_maintenance_cost + mileage_maintenance_cost) / 2
+
+@instrument.timed('vehicle_cost.format')
+def format_summary(name,
+                   is_new,
+                   cost_per_mile,
+                   cost_per_year,
+                   years_own,
+                   selling_amt,
+                   cost_at_loan_payoff):
+    new_indicator = '*' if is_new else ' '
+    return "{:>3}  {:<20}  {:5.2f}  {:5.1f}  {:4.0f}  {:6.0f}  {:5.1f}  {:5.1f} {:5.1f}".format(
+                                                     new_indicator,
+                                                     name,
+                                                     cost_per_mile,
+                                                     cost_per_year/1000,
+                                                     cost_per_year/12,
+                                                     years_own,
+                                                     selling_amt/1000,
+                                                     cost_per_year/1000 * 10,
+                                                     cost_at_loan_payoff/1000)
+
+class VehicleResult(object):
+    '''
+    numbers behind one summary row, rendered only on demand
+    '''
+
+    __slots__ = ('name',
+                 'is_new',
+                 'cost_per_mile',
+                 'cost_per_year',
+                 'years_own',
+                 'selling_amt',
+                 'cost_at_loan_payoff',
+                 'tax_paid',
+                 'fuel_cost_per_year')
+
+    def __init__(self, name, is_new, cost_per_mile, cost_per_year, years_own, selling_amt,
+                 cost_at_loan_payoff, tax_paid, fuel_cost_per_year):
+        self.name = name
+        self.is_new = is_new
+        self.cost_per_mile = cost_per_mile
+        self.cost_per_year = cost_per_year
+        self.years_own = years_own
+        self.selling_amt = selling_amt
+        self.cost_at_loan_payoff = cost_at_loan_payoff
+        self.tax_paid = tax_paid
+        self.fuel_cost_per_year = fuel_cost_per_year
+
+    def summary(self):
+        return format_summary(self.name,
+                              self.is_new,
+                              self.cost_per_mile,
+                              self.cost_per_year,
+                              self.years_own,
+                              self.selling_amt,
+                              self.cost_at_loan_payoff)
+
+    def __repr__(self):
+        return "VehicleResult({!r}, cost_per_mile={:.4f})".format(self.name, self.cost_per_mile)
+
+@instrument.timed('vehicle_cost.evaluate')
+def evaluate(name,
+             purchase_cost_no_tax,
+             tax_rate,
+             depreciation_coef,
+             miles_per_year,
+             insurance_rate,
+             starting_mileage,
+             mpg,
+             fuel_price,
+             selling_mileage,
+             maintenance_per_year,
+             mileage_deprec_importance = 0.3,
+             apr = 0.03,
+             loan_term = 60,
+             elec_cost = 1.0,
+             elec_pct = 0.0,
+             miles_per_kwh = 0.1,
+             full_maintenance_age = 15,
+             selling_amt = None,
+             is_new = False,
+             vehicle_life_miles = 250000):
+    '''
+    one vehicle, no printing or formatting, returns a VehicleResult
     '''
-    monthly_payment = P * (r * (1+r)**n) / ((1+r)**n - 1)
-    interest = monthly_payment * n - P
-    return interest
-
-def main(all_cost,
-         all_summary,
-         name,
-         purchase_cost_no_tax,
-         tax_rate,
-         depreciation_coef,
-         miles_per_year,
-         insurance_rate,
-         starting_mileage,
-         mpg,
-         fuel_price,
-         selling_mileage,
-         maintenance_per_year,
-         mileage_deprec_importance = 0.3,
-         apr = 0.03,
-         loan_term = 60,
-         elec_cost = 1.0,
-         elec_pct = 0.0,
-         miles_per_kwh = 0.1,
-         full_maintenance_age = 15,
-         selling_amt = None,
-         is_new = False,
-         vehicle_life_miles = 250000):
     miles_driven = selling_mileage - starting_mileage
     years_own = (miles_driven) / (1.0 * miles_per_year)
 
@@ -70,14 +159,12 @@ def main(all_cost,
                                       selling_mileage,
                                       vehicle_life_miles)
 
-    insurance_cost = insurance_rate * 2 * years_own
-
-
-    pct_mileage_maintenance_done = min(1.0, float(selling_mileage-starting_mileage) / vehicle_life_miles)
-    mileage_maintenance_cost = full_maintenance_age * maintenance_per_year * pct_mileage_maintenance_done
-
-    time_maintenance_cost = maintenance_per_year * years_own
-    maintenance_cost = (time_maintenance_cost + mileage_maintenance_cost) / 2
+    insurance_cost = get_insurance_cost(insurance_rate, years_own)
+    maintenance_cost = get_maintenance_cost(maintenance_per_year,
+                                            full_maintenance_age,
+                                            miles_driven,
+                                            years_own,
+                                            vehicle_life_miles)
 
     fuel_cost = get_fuel_cost(mpg, miles_driven, fuel_price, miles_per_kwh, elec_cost, elec_pct)
     interest_cost = compute_loan_cost(purchase_cost_with_tax, apr / 12, loan_term)
@@ -96,27 +183,114 @@ def main(all_cost,
     cost_at_loan_payoff = purchase_cost_with_tax + interest_cost + (constant_costs * (loan_term/12) / years_own)
 
 
-    new_indicator = '*' if is_new else ' '
-    summary = "{:>3}  {:<20}  {:5.2f}  {:5.1f}  {:4.0f}  {:6.0f}  {:5.1f}  {:5.1f} {:5.1f}".format(
-                                                     new_indicator,
-                                                     name,
-                                                     cost_per_mile,
-                                                     cost_per_year/1000,
-                                                     cost_per_year/12,
-                                                     years_own,
-                                                     selling_amt/1000,
-                                                     cost_per_year/1000 * 10,
-                                                     cost_at_loan_payoff/1000)
-    all_cost.append(cost_per_mile)
-    all_summary.append(summary)
-    print(name, int(purchase_cost_no_tax * (tax_rate-1)), fuel_cost / years_own)
+    return VehicleResult(name,
+                         is_new,
+                         cost_per_mile,
+                         cost_per_year,
+                         years_own,
+                         selling_amt,
+                         cost_at_loan_payoff,
+                         purchase_cost_no_tax * (tax_rate-1),
+                         fuel_cost / years_own)
+
+@instrument.timed('vehicle_cost.main')
+def main(all_cost, all_summary, *args, **kwargs):
+    '''
+    evaluate, then append the cost and summary row and print the debug line
+    takes the same arguments as evaluate
+    '''
+    result = evaluate(*args, **kwargs)
+    all_cost.append(result.cost_per_mile)
+    all_summary.append(result.summary())
+    with instrument.stage('vehicle_cost.print'):
+        print(result.name, int(result.tax_paid), result.fuel_cost_per_year)
     return all_cost, all_summary
 
+@instrument.timed('vehicle_cost.main_batch')
+def main_batch(purchase_cost_no_tax,
+               tax_rate,
+               depreciation_coef,
+               miles_per_year,
+               insurance_rate,
+               starting_mileage,
+               mpg,
+               fuel_price,
+               selling_mileage,
+               maintenance_per_year,
+               mileage_deprec_importance = 0.3,
+               apr = 0.03,
+               loan_term = 60,
+               elec_cost = 1.0,
+               elec_pct = 0.0,
+               miles_per_kwh = 0.1,
+               full_maintenance_age = 15,
+               selling_amt = None,
+               vehicle_life_miles = 250000):
+    '''
+    vectorized main, one row per vehicle
+    every input is a column array or a scalar shared by all rows
+    selling_amt may be None (computed) or an array with nan where it should be computed
+    returns dict of arrays: cost_per_mile, cost_per_year, years_own, selling_amt, cost_at_loan_payoff
+    '''
+    purchase_cost_no_tax = np.asarray(purchase_cost_no_tax, dtype=float)
+    selling_mileage = np.asarray(selling_mileage, dtype=float)
+
+    miles_driven = selling_mileage - starting_mileage
+    years_own = (miles_driven) / (1.0 * miles_per_year)
+
+    purchase_cost_with_tax = purchase_cost_no_tax * tax_rate
+    computed_selling_amt = get_selling_amt(purchase_cost_no_tax,
+                                           depreciation_coef,
+                                           years_own,
+                                           mileage_deprec_importance,
+                                           selling_mileage,
+                                           vehicle_life_miles)
+    if selling_amt is None:
+        selling_amt = computed_selling_amt
+    else:
+        selling_amt = np.asarray(selling_amt, dtype=float)
+        selling_amt = np.where(np.isnan(selling_amt), computed_selling_amt, selling_amt)
+
+    insurance_cost = get_insurance_cost(insurance_rate, years_own)
+    maintenance_cost = get_maintenance_cost(maintenance_per_year,
+                                            full_maintenance_age,
+                                            miles_driven,
+                                            years_own,
+                                            vehicle_life_miles)
+
+    fuel_cost = get_fuel_cost_batch(mpg, miles_driven, fuel_price, miles_per_kwh, elec_cost, elec_pct)
+    interest_cost = compute_loan_cost_array(purchase_cost_with_tax, np.asarray(apr, dtype=float) / 12, loan_term)
+
+    total_cost = ( purchase_cost_with_tax
+                 + insurance_cost
+                 + fuel_cost
+                 + maintenance_cost
+                 + interest_cost
+                 - selling_amt)
+    cost_per_mile = total_cost / miles_driven
+    cost_per_year = total_cost / years_own
+
+    constant_costs = fuel_cost + maintenance_cost + insurance_cost
+    cost_at_loan_payoff = purchase_cost_with_tax + interest_cost + (constant_costs * (np.asarray(loan_term)/12) / years_own)
+
+    return {'cost_per_mile': cost_per_mile,
+            'cost_per_year': cost_per_year,
+            'years_own': np.broadcast_to(years_own, np.shape(cost_per_mile)),
+            'selling_amt': np.broadcast_to(selling_amt, np.shape(cost_per_mile)),
+            'cost_at_loan_payoff': cost_at_loan_payoff}
+
 def print_summary(all_cost, all_summary):
     sorted_keys = sorted(range(len(all_cost)), key=all_cost.__getitem__)
     for k in sorted_keys:
         print(all_summary[k])
 
+def print_results(results, limit = None):
+    '''
+    print_summary for VehicleResults, only the rows shown are formatted
+    '''
+    for result in sorted(results, key=lambda r: r.cost_per_mile)[:limit]:
+        print(result.summary())
+
 if __name__ == "__main__":
 
     miles_per_year = 10000